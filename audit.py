@@ -0,0 +1,241 @@
+from locking import FileLock
+import json
+import os
+import threading
+import time
+
+
+class AuditLog:
+    def __init__(self, path='audit.jsonl', max_bytes=1024 * 1024, backup_count=10):
+        """
+        Initializes a structured audit log of the changes made to contacts.
+
+        Each change is appended as one JSON line carrying a stable audit id for the contact,
+        the operation and the contact fields before and after it. The log is split into
+        numbered segments of about max_bytes, and only the newest backup_count segments are
+        kept. A sidecar index maps every audit id to the segments and offsets of its records,
+        so the history of one contact is read without scanning the log. The index is read on
+        the first record or history, so opening a phone book only to read it skips it.
+
+        Several processes may share the log. Appends hold an advisory lock on path + '.lock'
+        and take their offset from the size of the segment, and every process first indexes
+        the records the others appended, adopting the sidecar index when another process
+        saved a newer one, so neither offsets nor the saved index go stale.
+
+        Args:
+            path (str, optional): Path of the log; segments are named after it. Defaults to 'audit.jsonl'.
+            max_bytes (int, optional): Size at which a new segment is started. Defaults to 1 MB.
+            backup_count (int, optional): Number of segments kept. Defaults to 10.
+        """
+        self.path = path
+        self.index_path = path + '.index'
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.segments = [1]  # Numbers of the segments kept, oldest first; the last one is written to.
+        self.offsets = {}  # Maps audit ids to lists of [segment, offset] pairs.
+        self.ids = {}  # Maps the normalized phone numbers of current contacts to their audit ids.
+        self.indexed_size = 0  # Bytes of the active segment covered by the index.
+        self.index_signature = None  # Inode, size and modification time of the sidecar index when last read or written.
+        self.lock = threading.RLock()  # Held, around file_lock, while the log is read or appended to.
+        self.file_lock = FileLock(path + '.lock')
+        self.file = None
+        self.loaded = False
+
+    def segment_path(self, segment):
+        """
+        Returns the path of a segment.
+        """
+        root, extension = os.path.splitext(self.path)
+        return f'{root}.{segment:06d}{extension}'
+
+    def load(self):
+        """
+        Reads the sidecar index, then indexes the records appended after it was last saved.
+        """
+        with self.lock, self.file_lock:
+            self.loaded = True
+            self.catch_up()
+
+    def catch_up(self):
+        """
+        Indexes the records appended since this log last looked, by this process or another,
+        first adopting the sidecar index if another process saved one covering more of the
+        log. Must be called with the locks held.
+        """
+        signature = self.index_file_signature()
+        if signature != self.index_signature:
+            self.index_signature = signature
+            try:
+                with open(self.index_path, 'r') as file:
+                    data = json.load(file)
+            except FileNotFoundError:
+                data = None
+            if data is not None and (data['segments'][-1], data['indexed_size']) > (self.segments[-1], self.indexed_size):
+                if data['segments'][-1] != self.segments[-1]:
+                    self.close_file()  # Another process rotated the log.
+                self.segments, self.offsets, self.ids = data['segments'], data['offsets'], data['ids']
+                self.indexed_size = data['indexed_size']
+
+        segment_path = self.segment_path(self.segments[-1])
+        try:
+            if os.path.getsize(segment_path) == self.indexed_size:
+                return  # Nothing appended; a stat is all it costs.
+        except FileNotFoundError:
+            return
+        offset = self.indexed_size
+        with open(segment_path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Torn by a crash while being written.
+                self.index_record(record, self.segments[-1], offset)
+                offset += len(line)
+        if offset < os.path.getsize(segment_path):
+            os.truncate(segment_path, offset)  # Drop the torn record so new records can follow.
+        self.indexed_size = offset
+
+    def index_file_signature(self):
+        """
+        Returns the inode, size and modification time of the sidecar index, or None if it
+        does not exist.
+        """
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def index_record(self, record, segment, offset):
+        """
+        Adds a record to the in-memory index.
+
+        Args:
+            record (dict): The audit record.
+            segment (int): Number of the segment holding it.
+            offset (int): Offset of the record in the segment.
+        """
+        audit_id = record['id']
+        self.offsets.setdefault(audit_id, []).append([segment, offset])
+        self.ids.pop(record['key'], None)
+        if record['op'] != 'delete':
+            self.ids[record['new_key']] = audit_id
+
+    def record(self, operation, key, new_key=None, before=None, after=None):
+        """
+        Appends the record of a change to a contact.
+
+        Args:
+            operation (str): 'add', 'update' or 'delete'.
+            key (str): Normalized phone number of the contact before the change.
+            new_key (str, optional): Normalized phone number after the change. Defaults to key.
+            before (dict, optional): Fields of the contact before the change.
+            after (dict, optional): Fields of the contact after the change.
+        """
+        with self.lock, self.file_lock:
+            self.loaded = True
+            self.catch_up()
+            if operation == 'add' or key not in self.ids:
+                # A new contact, even if it reuses the number of a deleted one. Random like a uuid4,
+                # without importing uuid at startup.
+                audit_id = os.urandom(16).hex()
+            else:
+                audit_id = self.ids[key]
+            record = {'time': int(time.time()), 'id': audit_id, 'op': operation, 'key': key,
+                      'new_key': key if new_key is None else new_key, 'before': before, 'after': after}
+            line = (json.dumps(record) + '\n').encode()
+
+            if self.file is None:
+                self.file = open(self.segment_path(self.segments[-1]), 'ab')
+            # The segment may have grown since this process last wrote to it, so tell() is stale.
+            offset = os.fstat(self.file.fileno()).st_size
+            self.file.write(line)
+            self.file.flush()
+            self.index_record(record, self.segments[-1], offset)
+            self.indexed_size = offset + len(line)
+
+            if self.indexed_size >= self.max_bytes:
+                self.rotate()
+
+    def rotate(self):
+        """
+        Starts a new segment, deleting the oldest ones beyond backup_count. Must be called
+        with the locks held.
+        """
+        self.close_file()
+        self.segments.append(self.segments[-1] + 1)
+        self.indexed_size = 0
+        dropped = set(self.segments[:-self.backup_count])
+        if dropped:
+            self.segments = self.segments[-self.backup_count:]
+            for segment in dropped:
+                if os.path.exists(self.segment_path(segment)):
+                    os.remove(self.segment_path(segment))
+            for audit_id in list(self.offsets):
+                kept = [entry for entry in self.offsets[audit_id] if entry[0] not in dropped]
+                if kept:
+                    self.offsets[audit_id] = kept
+                else:
+                    del self.offsets[audit_id]
+        self.save_index()
+
+    def save_index(self):
+        """
+        Writes the sidecar index. Must be called with the locks held, after catch_up, so
+        it covers the records of every process.
+        """
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'segments': self.segments, 'offsets': self.offsets, 'ids': self.ids,
+                       'indexed_size': self.indexed_size}, file)
+        os.replace(temp_path, self.index_path)
+        self.index_signature = self.index_file_signature()
+
+    def history(self, key):
+        """
+        Reads the records of the contact currently using a phone number.
+
+        Args:
+            key (str): Normalized phone number of the contact.
+
+        Returns:
+            list: The audit records of the contact, oldest first.
+        """
+        with self.lock, self.file_lock:
+            self.loaded = True
+            self.catch_up()
+            audit_id = self.ids.get(key)
+            if audit_id is None:
+                return []
+            records = []
+            files = {}
+            try:
+                for segment, offset in self.offsets.get(audit_id, []):
+                    if segment not in files:
+                        files[segment] = open(self.segment_path(segment), 'rb')
+                    files[segment].seek(offset)
+                    records.append(json.loads(files[segment].readline()))
+            finally:
+                for file in files.values():
+                    file.close()
+        return records
+
+    def close_file(self):
+        """
+        Closes the active segment if it is open.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        """
+        Saves the sidecar index and closes the active segment.
+        """
+        with self.lock:
+            if self.loaded:
+                with self.file_lock:
+                    self.catch_up()
+                    self.save_index()
+            self.close_file()
@@ -0,0 +1,235 @@
+"""
+Benchmarks PhoneBook operations on synthetic phone books of several sizes.
+
+Each size runs in its own temporary directory, so no real contacts file is touched.
+Results are printed and saved as JSON; pass a previous results file with --compare
+to see how throughput changed between runs.
+
+Usage:
+    python bench.py [--sizes 10000 100000 1000000] [--ops 100] [--storage jsonl]
+                    [--output bench_results.json] [--compare previous.json] [--no-memory]
+"""
+from contact import Contact
+from phonebook import PhoneBook
+from storage import BinaryStorage, JournalStorage, JsonLinesStorage, JsonStorage, ShardedStorage, SqliteStorage
+import argparse
+import contextlib
+import csv
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William',
+               'Elizabeth', 'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah',
+               'Charles', 'Karen', 'Daniel', 'Nancy', 'Matthew', 'Lisa', 'Anthony', 'Betty', 'Mark', 'Sandra',
+               'Paul', 'Ashley', 'Steven', 'Emily', 'Andrew', 'Donna', 'Kenneth', 'Michelle', 'Joshua', 'Carol',
+               'Kevin', 'Amanda', 'Brian', 'Melissa', 'George', 'Deborah', 'Timothy', 'Stephanie', 'Ronald', 'Rebecca']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore',
+              'Jackson', 'Martin', 'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez',
+              'Lewis', 'Robinson', 'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres', 'Nguyen',
+              'Hill', 'Flores', 'Green', 'Adams', 'Nelson', 'Baker', 'Hall', 'Rivera', 'Campbell', 'Mitchell']
+STREETS = ['Maple Street', 'Oak Avenue', 'Pine Lane', 'Cedar Road', 'Elm Street', 'Bank Street',
+           'Rideau Street', 'King Edward Avenue', 'Laurier Avenue', 'Somerset Street']
+DOMAINS = ['example.com', 'mail.com', 'uottawa.ca', 'company.org']
+STORAGES = {'binary': BinaryStorage, 'json': JsonStorage, 'jsonl': JsonLinesStorage, 'journal': JournalStorage,
+            'sharded': ShardedStorage, 'sqlite': SqliteStorage}
+
+
+def format_phone_number(number):
+    """
+    Formats a 10-digit number as (###) ###-####.
+    """
+    return f'({number // 10 ** 7:03d}) {number // 10 ** 4 % 1000:03d}-{number % 10 ** 4:04d}'
+
+
+def generate_contacts(count, rng, numbers):
+    """
+    Yields synthetic contacts with realistic names and unique phone numbers.
+
+    Args:
+        count (int): Number of contacts.
+        rng (random.Random): Source of randomness, for reproducible data.
+        numbers (set): Phone numbers already used, updated with the new ones.
+
+    Yields:
+        Contact: One synthetic contact.
+    """
+    for _ in range(count):
+        number = rng.randrange(2000000000, 10000000000)
+        while number in numbers:
+            number = rng.randrange(2000000000, 10000000000)
+        numbers.add(number)
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        email = f'{first_name.lower()}.{last_name.lower()}{rng.randrange(1000)}@{rng.choice(DOMAINS)}'
+        address = f'{rng.randrange(1, 9999)} {rng.choice(STREETS)}'
+        yield Contact(first_name, last_name, format_phone_number(number), email, address)
+
+
+def write_csv(path, contacts):
+    """
+    Writes contacts to a CSV file in the format read by batch_import.
+    """
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['first_name', 'last_name', 'phone_number', 'email', 'address'])
+        for contact in contacts:
+            writer.writerow([contact.first_name, contact.last_name, contact.phone_number, contact.email, contact.address])
+
+
+def measure(function, calls, trace_memory):
+    """
+    Calls a function once per set of arguments and summarizes its latency and memory use.
+
+    Args:
+        function (callable): The operation to measure.
+        calls (list): One tuple of arguments per call.
+        trace_memory (bool): Whether tracemalloc is running and peak memory should be reported.
+
+    Returns:
+        dict: Number of calls, throughput, p50/p99 latency and peak memory above the start.
+    """
+    if trace_memory:
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+    latencies = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for arguments in calls:
+            start = time.perf_counter()
+            function(*arguments)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'calls': len(latencies),
+        'ops_per_second': len(latencies) / total if total else None,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'peak_memory_bytes': tracemalloc.get_traced_memory()[1] - start_memory if trace_memory else None,
+    }
+
+
+def run_size(size, ops, storage_name, trace_memory, seed=0):
+    """
+    Builds a phone book of the given size by batch import and measures every operation on it.
+
+    Args:
+        size (int): Number of contacts in the phone book.
+        ops (int): Number of calls measured for each per-contact operation.
+        storage_name (str): Key of STORAGES selecting the storage of the phone book.
+        trace_memory (bool): Whether to report peak memory.
+        seed (int, optional): Seed of the synthetic data. Defaults to 0.
+
+    Returns:
+        dict: The measurements of each operation.
+    """
+    rng = random.Random(seed)
+    original_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            results = measure_operations(size, ops, storage_name, trace_memory, rng)
+        finally:
+            os.chdir(original_directory)
+    return results
+
+
+def measure_operations(size, ops, storage_name, trace_memory, rng):
+    """
+    Measures every operation on a phone book created in the current directory.
+
+    Args:
+        size (int): Number of contacts in the phone book.
+        ops (int): Number of calls measured for each per-contact operation.
+        storage_name (str): Key of STORAGES selecting the storage of the phone book.
+        trace_memory (bool): Whether to report peak memory.
+        rng (random.Random): Source of randomness for the synthetic data.
+
+    Returns:
+        dict: The measurements of each operation.
+    """
+    numbers = set()
+    results = {}
+    write_csv('contacts.csv', generate_contacts(size, rng, numbers))
+    new_contacts = list(generate_contacts(ops, rng, numbers))
+    existing = [format_phone_number(number) for number in rng.sample(sorted(numbers), ops)]
+
+    phonebook = PhoneBook(STORAGES[storage_name]())
+    results['batch_import'] = measure(phonebook.batch_import, [('contacts.csv',)], trace_memory)
+    results['add_contact'] = measure(phonebook.add_contact, [(contact,) for contact in new_contacts], trace_memory)
+    results['search'] = measure(phonebook.search, [(rng.choice(LAST_NAMES)[:4],) for _ in range(ops)], trace_memory)
+    results['find_contact'] = measure(phonebook.find_contact, [(phone[6:11],) for phone in existing], trace_memory)
+    results['list_contacts_page'] = measure(
+        phonebook.list_contacts, [('last_name', rng.randrange(size), 20) for _ in range(ops)], trace_memory)
+    results['list_contacts_all'] = measure(phonebook.list_contacts, [('first_name',)] * 3, trace_memory)
+    results['find_duplicates'] = measure(phonebook.find_duplicates, [()], trace_memory)
+    results['update_contact'] = measure(
+        phonebook.update_contact, [(phone, None, None, None, 'updated@example.com') for phone in existing], trace_memory)
+    results['audit_contact'] = measure(
+        phonebook.audit_contact, [(phonebook.find_contact_by_phone_number(phone),) for phone in existing], trace_memory)
+    results['delete_contact'] = measure(phonebook.delete_contact, [(phone,) for phone in existing], trace_memory)
+    results['save_contacts'] = measure(phonebook.save_contacts, [()] * 3, trace_memory)
+    results['load_contacts'] = measure(phonebook.load_contacts, [()] * 3, trace_memory)
+    phonebook.close()
+    return results
+
+
+def print_results(size, results, previous=None):
+    """
+    Prints the measurements of one size, with the throughput ratio to a previous run if given.
+    """
+    print(f'\n{size} contacts')
+    print(f'{"operation":<20}{"ops/s":>12}{"p50 ms":>10}{"p99 ms":>10}{"peak MB":>10}{"vs prev":>10}')
+    for operation, stats in results.items():
+        peak = '' if stats['peak_memory_bytes'] is None else f'{stats["peak_memory_bytes"] / 2 ** 20:.1f}'
+        ratio = ''
+        if previous and operation in previous and previous[operation]['ops_per_second'] and stats['ops_per_second']:
+            ratio = f'{stats["ops_per_second"] / previous[operation]["ops_per_second"]:.2f}x'
+        print(f'{operation:<20}{stats["ops_per_second"] or 0:>12.1f}{stats["p50_ms"]:>10.2f}'
+              f'{stats["p99_ms"]:>10.2f}{peak:>10}{ratio:>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PhoneBook operations on synthetic phone books.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--ops', type=int, default=100, help='calls measured per operation and size')
+    parser.add_argument('--storage', choices=sorted(STORAGES), default='jsonl')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='results file of a previous run')
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc, for timings without its overhead')
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)['sizes']
+
+    # Keep the phone book's log messages out of the working directory.
+    log_directory = tempfile.TemporaryDirectory()
+    logging.basicConfig(filename=os.path.join(log_directory.name, 'logs.txt'), level=logging.INFO,
+                        format='%(asctime)s - %(message)s')
+    if not args.no_memory:
+        tracemalloc.start()
+
+    output = {'python': sys.version.split()[0], 'platform': platform.platform(), 'time': int(time.time()),
+              'storage': args.storage, 'ops': args.ops, 'sizes': {}}
+    for size in args.sizes:
+        results = run_size(size, args.ops, args.storage, not args.no_memory)
+        output['sizes'][str(size)] = results
+        print_results(size, results, previous.get(str(size)))
+
+    with open(args.output, 'w') as file:
+        json.dump(output, file, indent=2)
+    print(f'\nResults saved to {args.output}')
+    log_directory.cleanup()
+
+
+if __name__ == '__main__':
+    main()
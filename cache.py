@@ -0,0 +1,115 @@
+from collections import OrderedDict
+import functools
+import re
+
+
+PATTERN_CACHE_SIZE = 256  # Compiled search patterns kept by compile_pattern until set_pattern_cache_size.
+
+
+class QueryCache:
+    def __init__(self, max_size=256):
+        """
+        Initializes a bounded LRU cache of query results.
+
+        Each result is stored with the generation of the storage it was computed from; the
+        storage bumps its generation on every change, so an entry from an older generation
+        is a miss and never has to be found and removed when the phone book changes.
+
+        Args:
+            max_size (int, optional): Maximum number of results kept, or 0 to disable the
+                cache. Defaults to 256.
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()  # Maps query keys to (generation, result), least recently used first.
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        """
+        Returns a cached result if it was computed at the given generation.
+
+        Args:
+            key (tuple): The search mode and term.
+            generation (int): The current generation of the storage.
+
+        Returns:
+            list: The cached result, or None on a miss.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != generation:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, generation, result):
+        """
+        Stores a result, evicting the least recently used ones beyond max_size.
+
+        Args:
+            key (tuple): The search mode and term.
+            generation (int): The generation of the storage the result was computed from.
+            result (list): The result.
+        """
+        if not self.max_size:
+            return
+        self.entries[key] = (generation, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every result.
+        """
+        self.entries.clear()
+
+    def stats(self):
+        """
+        Reports the use of the result cache and of the compiled pattern cache.
+
+        Returns:
+            dict: Hits, misses, size and maximum size of both caches.
+        """
+        patterns = cached_compile.cache_info()
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'max_size': self.max_size,
+                'pattern_hits': patterns.hits, 'pattern_misses': patterns.misses,
+                'pattern_size': patterns.currsize, 'pattern_max_size': patterns.maxsize}
+
+
+def compile_uncached(term):
+    return re.compile(term, re.IGNORECASE)
+
+
+cached_compile = functools.lru_cache(maxsize=PATTERN_CACHE_SIZE)(compile_uncached)
+
+
+def set_pattern_cache_size(max_size):
+    """
+    Sets how many compiled patterns compile_pattern keeps. The cache is shared by every
+    phone book in the process, so the last size set applies; changing it empties the cache.
+
+    Args:
+        max_size (int): Maximum number of patterns kept, or 0 to disable the cache.
+    """
+    global cached_compile
+    if cached_compile.cache_info().maxsize != max_size:
+        cached_compile = functools.lru_cache(maxsize=max_size)(compile_uncached)
+
+
+def compile_pattern(term):
+    """
+    Compiles a search term into a case-insensitive regex, once per distinct term while
+    it stays among the most recently used ones, see set_pattern_cache_size.
+
+    Args:
+        term (str): The regex.
+
+    Returns:
+        re.Pattern: The compiled pattern.
+
+    Raises:
+        re.error: If the term is not a valid regex.
+    """
+    return cached_compile(term)
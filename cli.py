@@ -1,19 +1,140 @@
+"""
+Manages the phone book from the terminal, with an interactive menu when run without
+arguments, or one command at a time for scripts and servers without a display.
+
+Usage:
+    python cli.py
+    python cli.py add FIRST_NAME LAST_NAME PHONE_NUMBER [--email EMAIL] [--address ADDRESS]
+    python cli.py get PHONE_NUMBER
+    python cli.py search TERM
+    python cli.py list [--sort-by FIELD] [--offset N] [--limit N]
+    python cli.py import CSV_FILE [CSV_FILE ...] [--processes N]
+    python cli.py export PATH [--format csv|jsonl]
+    python cli.py delete PHONE_NUMBER
+"""
 from phonebook import PhoneBook, Contact
-import tkinter as tk
+from storage import SORT_FIELDS, JsonLinesStorage
 from utils import green_print, red_print, import_contacts_from_csv
+from metrics import print_profile
+import argparse
 import os
 import subprocess
+import sys
+
+
+PAGE_SIZE = 20  # Number of contacts shown at once when viewing all contacts.
+WRITE_DELAY = 2.0  # Seconds a change may wait before being written to the contacts file.
+
+
+def build_parser():
+    """
+    Returns the parser of the commands, none of which asks for input.
+    """
+    parser = argparse.ArgumentParser(description='Manage the phone book. Without a command, opens the interactive menu.')
+    commands = parser.add_subparsers(dest='command')
+
+    add_parser = commands.add_parser('add', help='add a contact')
+    add_parser.add_argument('first_name')
+    add_parser.add_argument('last_name')
+    add_parser.add_argument('phone_number')
+    add_parser.add_argument('--email', default='')
+    add_parser.add_argument('--address', default='')
+
+    commands.add_parser('get', help='show the contact with a phone number').add_argument('phone_number')
+    commands.add_parser('search', help='show the contacts whose name matches a regex').add_argument('term')
+
+    list_parser = commands.add_parser('list', help='show the contacts, one page or all of them')
+    list_parser.add_argument('--sort-by', choices=SORT_FIELDS)
+    list_parser.add_argument('--offset', type=int, default=0)
+    list_parser.add_argument('--limit', type=int)
+
+    import_parser = commands.add_parser('import', help='import contacts from CSV files')
+    import_parser.add_argument('csv_files', nargs='+')
+    import_parser.add_argument('--processes', type=int, help='worker processes parsing the files')
+
+    export_parser = commands.add_parser('export', help='write every contact to a CSV or JSON lines file')
+    export_parser.add_argument('path', help="file to write, or - for standard output")
+    export_parser.add_argument('--format', choices=('csv', 'jsonl'),
+                               help='defaults to jsonl for a .jsonl path, csv otherwise')
+
+    commands.add_parser('delete', help='delete the contact with a phone number').add_argument('phone_number')
+    return parser
 
 
+def run_command(args):
+    """
+    Runs one command on the phone book and writes its changes before returning.
 
-def main():
-    phonebook = PhoneBook()
-    
-    # Initialize tkinter root once outside the loop
-    root = tk.Tk()
-    root.withdraw()  # Hide the tkinter window
+    Args:
+        args (argparse.Namespace): The parsed command line.
+
+    Returns:
+        int: The exit status: 0 on success, 1 if the command failed.
+    """
+    # Parse only the contacts the command reads, so a single lookup starts quickly.
+    phonebook = PhoneBook(JsonLinesStorage(lazy=True))
+    try:
+        if args.command == 'add':
+            if not phonebook.validate_phone_number(args.phone_number):
+                print(f"Invalid phone number {args.phone_number!r}.", file=sys.stderr)
+                return 1
+            if args.email and not phonebook.validate_email(args.email):
+                print(f"Invalid email {args.email!r}.", file=sys.stderr)
+                return 1
+            contact = Contact(args.first_name, args.last_name, args.phone_number, args.email, args.address)
+            phonebook.add_contact(contact)
+            return 0 if phonebook.find_contact_by_phone_number(args.phone_number) is contact else 1
+
+        elif args.command in ('get', 'delete'):
+            contact = phonebook.find_contact_by_phone_number(args.phone_number)
+            if contact is None:
+                print(f"No contact found with the phone number {args.phone_number}.", file=sys.stderr)
+                return 1
+            if args.command == 'get':
+                print(contact)
+            else:
+                phonebook.delete_contact(args.phone_number)
+
+        elif args.command == 'search':
+            for contact in phonebook.search(args.term):
+                print(contact)
+
+        elif args.command == 'list':
+            for contact in phonebook.list_contacts(args.sort_by, args.offset, args.limit):
+                print(contact)
+
+        elif args.command == 'import':
+            for file_path, report in phonebook.parallel_import(args.csv_files, args.processes).items():
+                print(f"Contacts imported from {file_path}: {report}")
+                for error in report.errors:
+                    print(f"  {error}", file=sys.stderr)
+
+        elif args.command == 'export':
+            export_format = args.format or ('jsonl' if args.path.endswith('.jsonl') else 'csv')
+            if args.path == '-':
+                phonebook.export_contacts(sys.stdout, export_format)
+            else:
+                with open(args.path, 'w', newline='') as file:
+                    count = phonebook.export_contacts(file, export_format)
+                print(f"{count} contacts exported to {args.path}")
+        return 0
+    finally:
+        phonebook.close()
+
+
+def interactive():
+    # Parse contacts only when they are shown or searched, so the menu appears right away,
+    # and write changes behind so that a burst of edits costs a single rewrite.
+    phonebook = PhoneBook(JsonLinesStorage(lazy=True, write_delay=WRITE_DELAY))
+
+    profiler = None  # Set while a command chosen with the 'p' prefix is being profiled.
 
     while True:
+        if profiler is not None:
+            profiler.disable()
+            print_profile(profiler, output='profile.prof')
+            profiler = None
+
         print("PhoneBook Manager")
         print("1. Add Contact")
         print("2. Batch Import from CSV")
@@ -23,8 +144,14 @@ def main():
         print("6. Delete Contact")
         print("7. View Logs")
         print("8. Exit")
+        print("9. View Statistics")
         
-        choice = input("Choose an option: ")
+        choice = input("Choose an option (prefix it with 'p' to profile it, e.g. p4): ")
+        if choice.startswith('p') and len(choice) > 1:
+            choice = choice[1:]
+            import cProfile  # Only needed when profiling.
+            profiler = cProfile.Profile()
+            profiler.enable()
         
         if choice == '1':
             while True:
@@ -55,33 +182,30 @@ def main():
             # Batch import from CSV
             print("Opening file dialog to select CSV file...")
             import_contacts_from_csv(phonebook)  # Open the file dialog via tkinter
-            root.destroy() 
 
 
         elif choice == '3':
-            # View all contacts.
-            contacts = phonebook.list_contacts()
-            for contact in contacts:
-                print(contact)
-                
-            sort_trigger = input("\nDo you want to sort the contact list? (y/n): ")
+            # View all contacts, one page at a time.
+            sort_trigger = input("Do you want to sort the contact list? (y/n): ")
+            sort_by = None
             if sort_trigger == 'y':
-                sort_by = input("enter 'f' for first name or 'l' for last name: ")
-                if sort_by == 'f':
-                    sorted_contacts = phonebook.list_contacts(sort_by="first_name")  
-                    print("\n\nSorted by first name: ",
-                          "\n---------------------\n")
-                    for sorted_contact in sorted_contacts:
-                        print(sorted_contact)
-                        
-                elif sort_by == 'l':
-                    print("\n\nSorted by last name: ",
-                          "\n---------------------\n")
-                    sorted_contacts = phonebook.list_contacts(sort_by="last_name")  
-                    for sorted_contact in sorted_contacts:
-                        print(sorted_contact)
-                        
-    
+                sort_choice = input("enter 'f' for first name, 'l' for last name, 'c' for creation time or 'u' for last update: ")
+                sort_by = {'f': 'first_name', 'l': 'last_name', 'c': 'created_at', 'u': 'updated_at'}.get(sort_choice)
+                if sort_by:
+                    heading = f"Sorted by {sort_by.replace('_', ' ')}: "
+                    print("\n\n" + heading, "\n" + "-" * len(heading) + "\n")
+
+            offset = 0
+            while True:
+                page = phonebook.list_contacts(sort_by=sort_by, offset=offset, limit=PAGE_SIZE)
+                for contact in page:
+                    print(contact)
+                if len(page) < PAGE_SIZE:
+                    break
+                if input("\nEnter 'n' for the next page, anything else to stop: ") != 'n':
+                    break
+                offset += PAGE_SIZE
+
         elif choice == '4':
             # Search for contacts by name.
             search_term = input("Enter search term: ")
@@ -89,6 +213,11 @@ def main():
             for contact in results:
                 print(contact)
 
+            # Suggest names and numbers starting with the term, in case it was typed partially.
+            completions = phonebook.complete(search_term, limit=5)
+            if completions:
+                print("\nDid you mean: " + ", ".join(completions))
+
         elif choice == '5':
             # Update a contact by phone number.
             phone_number = input("Enter the phone number of the contact to update: ")
@@ -140,12 +269,48 @@ def main():
 
 
         elif choice == '8':
-            # Exit the application.
+            # Write pending changes and exit the application.
             print("Exiting program...")
+            phonebook.close()
             break
-        
+
+        elif choice == '9':
+            # Show the call counts and latencies of the phone book operations.
+            stats = phonebook.stats()
+            print(f"{'Operation':<30}{'Calls':>8}{'Mean ms':>10}{'Max ms':>10}")
+            for name, operation in sorted(stats['operations'].items()):
+                print(f"{name:<30}{operation['calls']:>8}{operation['mean_ms']:>10.2f}{operation['max_ms']:>10.2f}")
+            print(f"\nBytes written: {stats['bytes_written']}")
+            print(f"Contacts scanned per search: {stats['contacts_scanned_per_query']:.1f}")
+            print(f"Search cache: {stats['cache']['hits']} hits, {stats['cache']['misses']} misses, "
+                  f"{stats['cache']['size']}/{stats['cache']['max_size']} results")
+
+        if profiler is not None:
+            # Print the profile now rather than after the prompt below.
+            profiler.disable()
+            print_profile(profiler, output='profile.prof')
+            profiler = None
+
         # Prompt to return to the main menu.
         input("\n\nPress Enter to go back to the main menu...")
 
+
+def main(argv=None):
+    """
+    Runs the command given on the command line, or the interactive menu without one.
+
+    Args:
+        argv (list, optional): The arguments. Defaults to those of the process.
+
+    Returns:
+        int: The exit status.
+    """
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        interactive()
+        return 0
+    return run_command(args)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
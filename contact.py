@@ -0,0 +1,88 @@
+from datetime import datetime
+import time
+
+
+class Contact:
+    # Slots instead of a per-instance __dict__, as a phone book can hold millions of contacts.
+    __slots__ = ('first_name', 'last_name', 'phone_number', 'email', 'address', 'created_at', 'updated_at')
+
+    def __init__(self, first_name, last_name, phone_number, email="", address="", created_at=None, updated_at=None):
+        """
+        Initializes a new Contact object with the provided details.
+
+        Args:
+            first_name (str): First name of the contact.
+            last_name (str): Last name of the contact.
+            phone_number (str): Phone number in the format (###) ###-####.
+            email (str, optional): Email address of the contact. Defaults to None.
+            address (str, optional): Physical address of the contact. Defaults to None.
+            created_at (int or str, optional): Creation time, as seconds since the epoch or
+                in the format '%Y-%m-%d %H:%M:%S'. Defaults to now.
+            updated_at (int or str, optional): Last update time, like created_at. Defaults to now.
+        """
+        self.first_name = first_name
+        self.last_name = last_name
+        self.phone_number = phone_number
+        self.email = email
+        self.address = address
+        self.created_at = to_timestamp(created_at) if created_at else int(time.time())
+        self.updated_at = to_timestamp(updated_at) if updated_at else self.created_at
+
+    def update(self, first_name=None, last_name=None, phone_number=None, email=None, address=None):
+        """
+        Updates contact information and updates the updated_at timestamp.
+
+        Args:
+            first_name (str, optional): Updated first name.
+            last_name (str, optional): Updated last name.
+            phone_number (str, optional): Updated phone number.
+            email (str, optional): Updated email.
+            address (str, optional): Updated address.
+        """
+        # Only update fields if new values are provided.
+        if first_name:
+            self.first_name = first_name
+        if last_name:
+            self.last_name = last_name
+        if phone_number:
+            self.phone_number = phone_number
+        if email:
+            self.email = email
+        if address:
+            self.address = address
+        self.updated_at = int(time.time())  # Update the timestamp when any detail is changed.
+
+    def to_dict(self):
+        """
+        Returns the fields of the contact, as saved in JSON files.
+
+        Returns:
+            dict: The contact fields by name.
+        """
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __str__(self):
+        """
+        Returns a string representation of the contact.
+
+        Returns:
+            str: A formatted string of contact information.
+        """
+        return f'{self.first_name} {self.last_name}, {self.phone_number}, {self.email}, {self.address}'
+
+
+def to_timestamp(value):
+    """
+    Converts a timestamp read from a file to seconds since the epoch.
+
+    Args:
+        value (int or str): Seconds since the epoch, or a local time in the format
+            '%Y-%m-%d %H:%M:%S' as written by older versions.
+
+    Returns:
+        int: Seconds since the epoch.
+    """
+    if isinstance(value, str) and not value.isdigit():
+        return int(datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp())
+    return int(value)
+
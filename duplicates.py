@@ -0,0 +1,123 @@
+from validation import normalize_phone_number
+from collections import defaultdict
+from difflib import SequenceMatcher
+import functools
+import itertools
+
+
+SOUNDEX_CODES = {letter: digit for digit, letters in (('1', 'bfpv'), ('2', 'cgjkqsxz'), ('3', 'dt'),
+                                                      ('4', 'l'), ('5', 'mn'), ('6', 'r'))
+                 for letter in letters}
+MAX_BLOCK = 100  # Blocks with more contacts are too common to tell duplicates apart, e.g. "John Smith".
+
+
+@functools.lru_cache(maxsize=65536)
+def soundex(name):
+    """
+    Returns the Soundex code of a name, equal for names that sound alike, e.g. "Jon" and "John".
+
+    Args:
+        name (str): The name.
+
+    Returns:
+        str: A letter and three digits, or '' for a name without letters.
+    """
+    letters = [character for character in name.lower() if 'a' <= character <= 'z']
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0])
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter)
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in 'hw':  # H and W do not separate letters with the same code.
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def features(contact):
+    """
+    Returns what a contact is blocked and scored by.
+
+    Args:
+        contact (Contact): The contact.
+
+    Returns:
+        tuple: Its lowercased full name, the Soundex codes of its names, the lowercased
+            local part of its email ('' without email) and the last seven digits of its phone number.
+    """
+    first_name, last_name = contact.first_name or '', contact.last_name or ''
+    local_part = contact.email.split('@')[0].lower() if contact.email else ''
+    return (f'{first_name} {last_name}'.lower(), soundex(first_name) + soundex(last_name), local_part,
+            normalize_phone_number(contact.phone_number)[-7:])
+
+
+def score(features, other, min_score=0.0):
+    """
+    Scores how likely two contacts are the same person.
+
+    Args:
+        features (tuple): The features of a contact.
+        other (tuple): The features of another contact.
+        min_score (float, optional): Scores known to be lower may be returned as 0. Defaults to 0.
+
+    Returns:
+        float: Between 0 and 1; the similarity of the full names counts for 0.6, the same
+            email local part for 0.25 and the same last seven phone digits for 0.15.
+    """
+    rest = 0.25 * bool(features[2] and features[2] == other[2]) + 0.15 * (features[3] == other[3])
+    if features[0] == other[0]:
+        return 0.6 + rest
+    matcher = SequenceMatcher(None, features[0], other[0])
+    # The quick ratios are upper bounds of the ratio; skip the full comparison when they are too low.
+    if 0.6 * matcher.real_quick_ratio() + rest < min_score or 0.6 * matcher.quick_ratio() + rest < min_score:
+        return 0.0
+    return 0.6 * matcher.ratio() + rest
+
+
+def find_duplicates(contacts, min_score=0.5, max_block=MAX_BLOCK):
+    """
+    Finds the pairs of contacts that are likely duplicates.
+
+    Contacts are grouped by blocking keys (the Soundex codes of their names, the local part
+    of their email and the last seven digits of their phone number), and only pairs sharing
+    a block are scored,
+    so the cost grows with the size of the blocks rather than with the square of the
+    number of contacts.
+
+    Args:
+        contacts (iterable): The contacts to compare.
+        min_score (float, optional): Lowest score of a returned pair. Defaults to 0.5.
+        max_block (int, optional): Blocks with more contacts are skipped. Defaults to MAX_BLOCK.
+
+    Returns:
+        list: (score, contact, other) tuples, highest score first; contact was added first.
+    """
+    contacts = list(contacts)
+    contact_features = [features(contact) for contact in contacts]
+    name_blocks, email_blocks, phone_blocks = defaultdict(list), defaultdict(list), defaultdict(list)
+    for position, (_, phonetic, local_part, phone) in enumerate(contact_features):
+        name_blocks[phonetic].append(position)
+        if local_part:
+            email_blocks[local_part].append(position)
+        if len(phone) == 7:
+            phone_blocks[phone].append(position)
+
+    scored = set()  # Pairs of positions already scored, as a pair can share several blocks.
+    candidates = []
+    for members in itertools.chain(name_blocks.values(), email_blocks.values(), phone_blocks.values()):
+        if not 2 <= len(members) <= max_block:
+            continue
+        for i, position in enumerate(members):
+            for other_position in members[i + 1:]:
+                if (position, other_position) in scored:
+                    continue
+                scored.add((position, other_position))
+                pair_score = score(contact_features[position], contact_features[other_position], min_score)
+                if pair_score >= min_score:
+                    candidates.append((pair_score, contacts[position], contacts[other_position]))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    return candidates
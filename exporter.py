@@ -0,0 +1,70 @@
+from validation import normalize_phone_number
+import csv
+import json
+
+
+CSV_FIELDS = ('first_name', 'last_name', 'phone_number', 'email', 'address')  # The columns read by the importer.
+FORMATS = ('csv', 'jsonl')
+
+
+def csv_rows(contacts):
+    """
+    Yields the header row, then one row per contact, in the columns of a CSV import.
+
+    Args:
+        contacts (iterable): The contacts.
+
+    Yields:
+        list: The values of one row.
+    """
+    yield list(CSV_FIELDS)
+    for contact in contacts:
+        yield [getattr(contact, field) or '' for field in CSV_FIELDS]
+
+
+def jsonl_lines(contacts):
+    """
+    Yields one JSON line per contact, with its normalized phone number under 'key' and its
+    timestamps, as in the files of JsonLinesStorage.
+
+    Args:
+        contacts (iterable): The contacts.
+
+    Yields:
+        str: One line, ending with a newline.
+    """
+    for contact in contacts:
+        yield json.dumps({'key': normalize_phone_number(contact.phone_number), **contact.to_dict()}) + '\n'
+
+
+def write_contacts(contacts, file, format='csv'):
+    """
+    Writes contacts to a file one at a time, as they are read from the iterable, so the
+    export never holds more than one contact's text in memory.
+
+    Args:
+        contacts (iterable): The contacts, e.g. a storage iterated lazily.
+        file (file): A text file open for writing; for CSV, opened with newline=''.
+        format (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+
+    Returns:
+        int: The number of contacts written.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported export format {format!r}, expected one of {', '.join(FORMATS)}")
+    count = 0
+
+    def counted(contacts):
+        nonlocal count
+        for contact in contacts:
+            count += 1
+            yield contact
+
+    if format == 'csv':
+        csv.writer(file).writerows(csv_rows(counted(contacts)))
+    else:
+        file.writelines(jsonl_lines(counted(contacts)))
+    return count
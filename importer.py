@@ -0,0 +1,174 @@
+from validation import normalize_many, validate_many
+import csv
+import io
+import os
+
+
+CHUNK_BYTES = 64 * 1024 * 1024  # Size of the byte ranges a large CSV file is split into.
+MAX_ERRORS = 20  # Invalid rows described in each report; the others are only counted.
+
+
+class ImportReport:
+    def __init__(self):
+        """
+        Initializes the counters describing the outcome of a bulk import.
+        """
+        self.added = 0
+        self.skipped_duplicate = 0
+        self.skipped_invalid = 0
+        self.missing_phone = 0
+        self.errors = []  # Descriptions of invalid rows and of failures to read the file.
+
+    def merge(self, other):
+        """
+        Adds the counters and errors of another report to this one.
+
+        Args:
+            other (ImportReport): The report to add.
+        """
+        self.added += other.added
+        self.skipped_duplicate += other.skipped_duplicate
+        self.skipped_invalid += other.skipped_invalid
+        self.missing_phone += other.missing_phone
+        self.errors.extend(other.errors[:MAX_ERRORS - len(self.errors)])
+
+    def __str__(self):
+        """
+        Returns a one-line summary of the import.
+
+        Returns:
+            str: The import counters.
+        """
+        return (f'{self.added} added, {self.skipped_duplicate} duplicates skipped, '
+                f'{self.skipped_invalid} invalid rows skipped, {self.missing_phone} rows without phone number')
+
+
+def parse_rows(rows, report):
+    """
+    Validates CSV rows and returns the fields of their contacts.
+
+    The phone numbers and emails are validated column by column, so each value costs a
+    single call of a precompiled pattern. Phone numbers are stored in the (###) ###-####
+    format whatever notation the file uses.
+
+    Args:
+        rows (list): Rows of values: first_name, last_name, phone_number, email, address.
+        report (ImportReport): Counts the rows that are rejected.
+
+    Returns:
+        list: The normalized phone number and the fields of the contact of each accepted
+            row, in order. Blank rows are ignored.
+    """
+    rows = [[value.strip() for value in row] + [''] * (5 - len(row)) for row in rows if any(row)]
+    phone_numbers = normalize_many([row[2] for row in rows])
+    emails_valid = validate_many([row[3] for row in rows], 'email')
+
+    accepted = []
+    for row, phone_number, email_valid in zip(rows, phone_numbers, emails_valid):
+        if not row[2]:
+            report.missing_phone += 1
+        elif phone_number is None:
+            report.skipped_invalid += 1
+            if len(report.errors) < MAX_ERRORS:
+                report.errors.append(f'invalid phone number {row[2]!r}')
+        elif row[3] and not email_valid:
+            report.skipped_invalid += 1
+            if len(report.errors) < MAX_ERRORS:
+                report.errors.append(f'invalid email {row[3]!r}')
+        else:
+            # Ensure no empty values are assigned to any field
+            key, display = phone_number
+            accepted.append((key, (row[0] or "Unknown", row[1] or "Unknown", display, row[3], row[4])))
+    return accepted
+
+
+def split_csv(path, chunk_bytes=CHUNK_BYTES):
+    """
+    Splits a CSV file into byte ranges of about chunk_bytes that start and end on line
+    boundaries, skipping the header row.
+
+    Quoted values spanning several lines are not supported in files large enough to be split.
+
+    Args:
+        path (str): Path of the CSV file.
+        chunk_bytes (int, optional): Target size of a range. Defaults to CHUNK_BYTES.
+
+    Returns:
+        list: (start, end) byte offsets.
+    """
+    ranges = []
+    with open(path, 'rb') as file:
+        file.readline()  # Skip the header row.
+        start = file.tell()
+        size = os.fstat(file.fileno()).st_size
+        while start < size:
+            file.seek(start + chunk_bytes)
+            file.readline()  # Move to the end of the line the boundary falls in.
+            end = min(file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_csv_range(path, start, end):
+    """
+    Parses and validates the rows of a byte range of a CSV file. Runs in a worker process.
+
+    Args:
+        path (str): Path of the CSV file.
+        start (int): Offset of the first row.
+        end (int): Offset after the last row.
+
+    Returns:
+        tuple: The list of (normalized phone number, contact fields) of the accepted rows,
+            in file order, and an ImportReport of the rejected ones.
+    """
+    report = ImportReport()
+    rows = []
+    try:
+        with open(path, 'rb') as file:
+            file.seek(start)
+            text = file.read(end - start).decode('utf-8')
+        rows = parse_rows(list(csv.reader(io.StringIO(text, newline=''))), report)
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        report.errors.append(f'bytes {start}-{end}: {e}')
+    return rows, report
+
+
+def parse_csv_files(csv_files, processes=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Parses and validates CSV files in a pool of processes, splitting large files into byte ranges.
+
+    Args:
+        csv_files (list): Paths of the CSV files.
+        processes (int, optional): Number of worker processes, or 1 to parse in this process.
+            Defaults to the number of CPUs.
+        chunk_bytes (int, optional): Target size of the byte ranges. Defaults to CHUNK_BYTES.
+
+    Yields:
+        tuple: The index of the file in csv_files, then the rows and report of parse_csv_range,
+            for every byte range in file order.
+    """
+    tasks = []
+    for index, path in enumerate(csv_files):
+        try:
+            ranges = split_csv(path, chunk_bytes)
+        except OSError as e:
+            report = ImportReport()
+            report.errors.append(str(e))
+            yield index, [], report
+            continue
+        tasks.extend((index, path, start, end) for start, end in ranges)
+
+    if processes == 1 or len(tasks) <= 1:
+        results = (parse_csv_range(path, start, end) for _, path, start, end in tasks)
+        for (index, _, _, _), (rows, report) in zip(tasks, results):
+            yield index, rows, report
+        return
+    # Imported on first use, as multiprocessing adds to the startup time of every script.
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(processes) as executor:
+        # map returns the results in the order of the tasks, keeping the merge deterministic.
+        results = executor.map(parse_csv_range, *zip(*[task[1:] for task in tasks]))
+        for (index, _, _, _), (rows, report) in zip(tasks, results):
+            yield index, rows, report
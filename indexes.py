@@ -0,0 +1,448 @@
+from validation import normalize_phone_number
+from collections import defaultdict
+import bisect
+import itertools
+import re
+
+
+WORD = re.compile(r'\w+')
+
+
+class TrigramIndex:
+    FIELDS = ('first_name', 'last_name', 'phone_number')
+
+    def __init__(self):
+        """
+        Initializes an inverted index from the three-character substrings (trigrams) of the
+        lowercased names and phone numbers of the contacts to the contacts containing them.
+
+        A substring query only has to check the contacts that contain all of its trigrams,
+        so its cost grows with the number of matches rather than with the phone book.
+        """
+        self.postings = {field: defaultdict(set) for field in self.FIELDS}
+        self.indexed = {}  # Maps contacts to their insertion sequence and the values indexed for them.
+        self.sequence = itertools.count()
+
+    def add(self, contact):
+        """
+        Indexes a contact.
+
+        Args:
+            contact (Contact): The contact to index.
+        """
+        values = tuple((getattr(contact, field) or '').lower() for field in self.FIELDS)
+        self.indexed[contact] = (next(self.sequence), values)
+        for field, value in zip(self.FIELDS, values):
+            for trigram in trigrams(value):
+                self.postings[field][trigram].add(contact)
+
+    def remove(self, contact):
+        """
+        Removes a contact from the index, using the values it was indexed with.
+
+        Args:
+            contact (Contact): The contact to remove, possibly already changed.
+
+        Returns:
+            int: The insertion sequence of the contact.
+        """
+        sequence, values = self.indexed.pop(contact)
+        for field, value in zip(self.FIELDS, values):
+            postings = self.postings[field]
+            for trigram in trigrams(value):
+                postings[trigram].discard(contact)
+                if not postings[trigram]:
+                    del postings[trigram]
+        return sequence
+
+    def update(self, contact):
+        """
+        Re-indexes a contact that was changed in place, keeping its position in the results.
+
+        Args:
+            contact (Contact): The changed contact.
+        """
+        sequence = self.remove(contact)
+        self.add(contact)
+        self.indexed[contact] = (sequence, self.indexed[contact][1])
+
+    def clear(self):
+        """
+        Removes every contact from the index.
+        """
+        self.__init__()
+
+    def search(self, term, fields):
+        """
+        Finds the contacts where any of the given fields contains a term, ignoring case.
+
+        Args:
+            term (str): A plain substring (no regex syntax) of at least three characters.
+            fields (tuple): The fields to search, among FIELDS.
+
+        Returns:
+            tuple: The list of matching contacts in insertion order, and the number of
+                candidates that were checked.
+        """
+        term = term.lower()
+        term_trigrams = trigrams(term)
+        matches = set()
+        checked = 0
+        for field in fields:
+            postings = self.postings[field]
+            # Intersect starting from the shortest posting list.
+            posting_lists = sorted((postings.get(trigram, set()) for trigram in term_trigrams), key=len)
+            candidates = set(posting_lists[0])
+            for posting_list in posting_lists[1:]:
+                if not candidates:
+                    break
+                candidates &= posting_list
+            # Sharing every trigram does not guarantee a match, e.g. "abcabd" and "bca".
+            position = self.FIELDS.index(field)
+            matches.update(contact for contact in candidates if term in self.indexed[contact][1][position])
+            checked += len(candidates)
+        return sorted(matches, key=lambda contact: self.indexed[contact][0]), checked
+
+
+def trigrams(value):
+    """
+    Returns the set of three-character substrings of a string.
+
+    Args:
+        value (str): The string.
+
+    Returns:
+        set: Its trigrams.
+    """
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class SortedView:
+    def __init__(self, field):
+        """
+        Initializes a list of the contacts kept sorted by one field, updated by bisect
+        insertion on each change so that listing a page never sorts the phone book.
+
+        Contacts with equal values stay in insertion order.
+
+        Args:
+            field (str): 'first_name' or 'last_name' (compared lowercased), 'created_at' or 'updated_at'.
+        """
+        self.field = field
+        self.entries = []  # Sorted (value, sequence, contact) tuples; sequences are unique, so contacts are never compared.
+        self.indexed = {}  # Maps contacts to the (value, sequence) they are sorted by.
+        self.sequence = itertools.count()
+
+    def sort_value(self, contact):
+        """
+        Returns the value a contact is sorted by.
+        """
+        value = getattr(contact, self.field)
+        return value.lower() if isinstance(value, str) else value
+
+    def add(self, contact, sequence=None):
+        """
+        Inserts a contact at its sorted position.
+
+        Args:
+            contact (Contact): The contact to add.
+            sequence (int, optional): Insertion sequence to keep, for a contact being updated.
+        """
+        if sequence is None:
+            sequence = next(self.sequence)
+        entry = (self.sort_value(contact), sequence, contact)
+        self.indexed[contact] = entry[:2]
+        bisect.insort(self.entries, entry)
+
+    def remove(self, contact):
+        """
+        Removes a contact, using the value it was sorted by.
+
+        Args:
+            contact (Contact): The contact to remove, possibly already changed.
+
+        Returns:
+            int: The insertion sequence of the contact.
+        """
+        value, sequence = self.indexed.pop(contact)
+        del self.entries[bisect.bisect_left(self.entries, (value, sequence))]
+        return sequence
+
+    def update(self, contact):
+        """
+        Moves a contact that was changed in place to its new sorted position.
+
+        Args:
+            contact (Contact): The changed contact.
+        """
+        self.add(contact, self.remove(contact))
+
+    def clear(self):
+        """
+        Removes every contact from the view.
+        """
+        self.__init__(self.field)
+
+    def page(self, offset=0, limit=None):
+        """
+        Returns a slice of the sorted contacts.
+
+        Args:
+            offset (int, optional): Number of contacts to skip. Defaults to 0.
+            limit (int, optional): Maximum number of contacts. Defaults to all of them.
+
+        Returns:
+            list: The contacts of the page, in sorted order.
+        """
+        end = None if limit is None else offset + limit
+        return [entry[2] for entry in self.entries[offset:end]]
+
+    def bounds(self, low=None, high=None):
+        """
+        Finds where the contacts with a value in a range are, by binary search.
+
+        Args:
+            low (optional): Smallest value included. Defaults to no bound.
+            high (optional): Largest value included. Defaults to no bound.
+
+        Returns:
+            tuple: The positions of the first contact in the range and after the last one.
+        """
+        start = 0 if low is None else bisect.bisect_left(self.entries, (low,))
+        end = len(self.entries) if high is None else bisect.bisect_right(self.entries, (high, float('inf')))
+        return start, max(start, end)
+
+    def range(self, low=None, high=None):
+        """
+        Returns the contacts with a value in a range, in sorted order.
+
+        Args:
+            low (optional): Smallest value included. Defaults to no bound.
+            high (optional): Largest value included. Defaults to no bound.
+
+        Returns:
+            list: The contacts.
+        """
+        start, end = self.bounds(low, high)
+        return [entry[2] for entry in self.entries[start:end]]
+
+
+class AttributeIndex:
+    def __init__(self, field, keys):
+        """
+        Initializes a secondary index from keys derived from one field of the contacts,
+        such as the domain of their email or the words of their address, to the contacts
+        having them.
+
+        Args:
+            field (str): The field indexed.
+            keys (callable): Returns the set of keys of a value of the field.
+        """
+        self.field = field
+        self.keys = keys
+        self.postings = defaultdict(set)
+        self.indexed = {}  # Maps contacts to the keys stored for them.
+
+    def add(self, contact):
+        """
+        Indexes a contact.
+
+        Args:
+            contact (Contact): The contact to index.
+        """
+        keys = self.keys(getattr(contact, self.field))
+        self.indexed[contact] = keys
+        for key in keys:
+            self.postings[key].add(contact)
+
+    def remove(self, contact):
+        """
+        Removes a contact, using the keys it was indexed with.
+
+        Args:
+            contact (Contact): The contact to remove, possibly already changed.
+        """
+        for key in self.indexed.pop(contact):
+            postings = self.postings[key]
+            postings.discard(contact)
+            if not postings:
+                del self.postings[key]
+
+    def update(self, contact):
+        """
+        Re-indexes a contact that was changed in place.
+
+        Args:
+            contact (Contact): The changed contact.
+        """
+        self.remove(contact)
+        self.add(contact)
+
+    def clear(self):
+        """
+        Removes every contact from the index.
+        """
+        self.__init__(self.field, self.keys)
+
+    def get(self, key):
+        """
+        Returns the contacts having a key.
+
+        Args:
+            key (str): The key, as returned by keys.
+
+        Returns:
+            set: The contacts. It must not be changed.
+        """
+        return self.postings.get(key, frozenset())
+
+
+def email_domain(email):
+    """
+    Returns the lowercased domain of an email address, as a set for AttributeIndex.
+
+    Args:
+        email (str): The email address, or None.
+
+    Returns:
+        set: The domain, or an empty set without one.
+    """
+    _, at, domain = (email or '').rpartition('@')
+    domain = domain.strip().lower()
+    return {domain} if at and domain else set()
+
+
+def address_words(address):
+    """
+    Returns the lowercased words of an address, as a set for AttributeIndex.
+
+    Args:
+        address (str): The address, or None.
+
+    Returns:
+        set: The words.
+    """
+    return set(WORD.findall((address or '').lower()))
+
+
+class TrieNode:
+    __slots__ = ('children', 'count', 'ends')
+
+    def __init__(self):
+        self.children = {}
+        self.count = 0  # Number of words stored in this subtree.
+        self.ends = 0  # Number of words ending at this node.
+
+
+class PrefixTrie:
+    def __init__(self):
+        """
+        Initializes a prefix trie over the lowercased first names, last names and phone
+        number digits of the contacts, used to autocomplete search terms.
+
+        Every node knows how many words are stored below it, so empty branches are removed
+        and listing completions never walks a branch without words.
+        """
+        self.root = TrieNode()
+        self.indexed = {}  # Maps contacts to the words stored for them.
+
+    def add(self, contact):
+        """
+        Stores the words of a contact.
+
+        Args:
+            contact (Contact): The contact to index.
+        """
+        words = (contact.first_name.lower(), contact.last_name.lower(), normalize_phone_number(contact.phone_number))
+        self.indexed[contact] = words
+        for word in words:
+            if not word:
+                continue
+            node = self.root
+            node.count += 1
+            for character in word:
+                node = node.children.setdefault(character, TrieNode())
+                node.count += 1
+            node.ends += 1
+
+    def remove(self, contact):
+        """
+        Removes the words of a contact, using the words it was indexed with.
+
+        Args:
+            contact (Contact): The contact to remove, possibly already changed.
+        """
+        for word in self.indexed.pop(contact):
+            if not word:
+                continue
+            node = self.root
+            node.count -= 1
+            for character in word:
+                child = node.children[character]
+                child.count -= 1
+                if not child.count:
+                    del node.children[character]  # Drop the branch, it holds no other word.
+                    break
+                node = child
+            else:
+                node.ends -= 1
+
+    def update(self, contact):
+        """
+        Re-indexes a contact that was changed in place.
+
+        Args:
+            contact (Contact): The changed contact.
+        """
+        self.remove(contact)
+        self.add(contact)
+
+    def clear(self):
+        """
+        Removes every contact from the trie.
+        """
+        self.__init__()
+
+    def complete(self, prefix, limit=10):
+        """
+        Lists the stored words starting with a prefix, in alphabetical order.
+
+        Args:
+            prefix (str): The lowercased prefix, or phone number digits.
+            limit (int, optional): Maximum number of completions. Defaults to 10.
+
+        Returns:
+            list: Up to limit words.
+        """
+        node = self.root
+        for character in prefix:
+            node = node.children.get(character)
+            if node is None:
+                return []
+
+        completions = []
+        stack = [(prefix, node)]
+        while stack and len(completions) < limit:
+            word, node = stack.pop()
+            if node.ends:
+                completions.append(word)
+            # Push in reverse order so the smallest character is visited first.
+            for character in sorted(node.children, reverse=True):
+                stack.append((word + character, node.children[character]))
+        return completions
+
+
+def completion_key(prefix):
+    """
+    Returns the form of a prefix stored in the trie: the digits for a phone number,
+    the lowercased text otherwise.
+
+    Args:
+        prefix (str): The prefix typed by the user.
+
+    Returns:
+        str: The prefix to look up.
+    """
+    if any(character.isdigit() for character in prefix) and not any(character.isalpha() for character in prefix):
+        return normalize_phone_number(prefix)
+    return prefix.lower()
@@ -0,0 +1,132 @@
+"""
+Load-tests a running phone book server (see server.py) and reports requests per second.
+
+Each connection sends requests back to back over keep-alive: mostly lookups, searches and
+page listings of contacts it added first, and a share of additions and updates.
+
+Usage:
+    python loadtest.py [--host 127.0.0.1] [--port 8080] [--connections 50]
+                       [--duration 10] [--write-ratio 0.1] [--seed-contacts 1000]
+"""
+from bench import LAST_NAMES, format_phone_number, generate_contacts
+from urllib.parse import quote
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+async def request(reader, writer, method, path, payload=None):
+    """
+    Sends one request on a keep-alive connection and reads the response.
+
+    Args:
+        reader (asyncio.StreamReader): The connection's reader.
+        writer (asyncio.StreamWriter): The connection's writer.
+        method (str): HTTP method.
+        path (str): Path and query string.
+        payload (optional): Value sent as the JSON body.
+
+    Returns:
+        tuple: The status code and the decoded JSON body, or None if there is none.
+    """
+    body = b'' if payload is None else json.dumps(payload).encode()
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    data = await reader.readexactly(length) if length else b''
+    return status, json.loads(data) if data else None
+
+
+async def run_connection(host, port, deadline, write_ratio, phone_numbers, rng, latencies, statuses):
+    """
+    Sends requests on one connection until the deadline.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.monotonic() < deadline:
+            choice = rng.random()
+            if choice < write_ratio / 2:
+                contact = next(generate_contacts(1, rng, set()))
+                call = ('POST', '/contacts', {'first_name': contact.first_name, 'last_name': contact.last_name,
+                                              'phone_number': contact.phone_number, 'email': contact.email})
+            elif choice < write_ratio:
+                call = ('PUT', '/contacts/' + quote(rng.choice(phone_numbers)), {'address': f'{rng.randrange(999)} Main St'})
+            elif choice < 0.5:
+                call = ('GET', '/contacts/' + quote(rng.choice(phone_numbers)), None)
+            elif choice < 0.8:
+                call = ('GET', '/search?q=' + rng.choice(LAST_NAMES)[:4], None)
+            else:
+                call = ('GET', f'/contacts?offset={rng.randrange(len(phone_numbers))}&limit=20&sort_by=last_name', None)
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, *call)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, connections, duration, write_ratio, seed_contacts, seed=0):
+    """
+    Adds seed contacts, then runs the connections and summarizes their requests.
+
+    Returns:
+        dict: Requests sent, requests per second, p50/p99 latency and the count of each status.
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    phone_numbers = []
+    for number in rng.sample(range(2000000000, 10000000000), seed_contacts):
+        phone_number = format_phone_number(number)
+        await request(reader, writer, 'POST', '/contacts', {'first_name': rng.choice(['Ann', 'Bob', 'Cy']),
+                                                            'last_name': rng.choice(LAST_NAMES),
+                                                            'phone_number': phone_number})
+        phone_numbers.append(phone_number)
+    writer.close()
+
+    latencies, statuses = [], {}
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(run_connection(host, port, deadline, write_ratio, phone_numbers,
+                                          random.Random(seed + 1 + i), latencies, statuses)
+                           for i in range(connections)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else None,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else None,
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test a running phone book server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load')
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='share of additions and updates')
+    parser.add_argument('--seed-contacts', type=int, default=1000, help='contacts added before the load')
+    args = parser.parse_args()
+
+    results = asyncio.run(load_test(args.host, args.port, args.connections, args.duration,
+                                    args.write_ratio, args.seed_contacts))
+    print(f"{results['requests']} requests, {results['requests_per_second']:.0f} requests/s, "
+          f"p50 {results['p50_ms']:.2f} ms, p99 {results['p99_ms']:.2f} ms")
+    print(f"Statuses: {results['statuses']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; the lock only excludes threads there.
+    fcntl = None
+
+
+class FileLock:
+    def __init__(self, path):
+        """
+        Initializes an advisory lock shared by every process opening the same lock file.
+
+        The lock is reentrant within a process: nested with blocks only lock the file once.
+        It is not thread-safe; callers hold a threading lock around it.
+
+        Args:
+            path (str): Path of the lock file, created if needed.
+        """
+        self.path = path
+        self.file = None
+        self.depth = 0
+
+    def __enter__(self):
+        if not self.depth:
+            self.file = open(self.path, 'a')
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if not self.depth:
+            # Closing the file releases the lock.
+            self.file.close()
+            self.file = None
@@ -0,0 +1,142 @@
+import bisect
+import functools
+import io
+import json
+import os
+import time
+
+
+class Metrics:
+    BUCKETS_MS = (0.1, 1, 10, 100, 1000)  # Upper bounds of the latency histogram buckets, plus one for slower calls.
+
+    def __init__(self, enabled=True, dump_path=None, dump_interval=60):
+        """
+        Initializes the collection of call counts and latencies of PhoneBook operations.
+
+        Args:
+            enabled (bool, optional): Whether calls are measured. When disabled, an instrumented
+                method only checks this flag. Defaults to True.
+            dump_path (str, optional): File where the metrics are written periodically. Defaults to None.
+            dump_interval (int, optional): Seconds between two dumps. Defaults to 60.
+        """
+        self.enabled = enabled
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.last_dump = time.monotonic()
+        self.operations = {}  # Maps operation names to [calls, total seconds, max seconds, histogram counts].
+        self.report = self.snapshot  # Returns what dump writes; PhoneBook replaces it with its stats().
+
+    def observe(self, name, seconds):
+        """
+        Records one call of an operation.
+
+        Args:
+            name (str): Name of the operation.
+            seconds (float): Duration of the call.
+        """
+        operation = self.operations.get(name)
+        if operation is None:
+            operation = self.operations[name] = [0, 0.0, 0.0, [0] * (len(self.BUCKETS_MS) + 1)]
+        operation[0] += 1
+        operation[1] += seconds
+        operation[2] = max(operation[2], seconds)
+        operation[3][bisect.bisect_left(self.BUCKETS_MS, seconds * 1000)] += 1
+
+        if self.dump_path and time.monotonic() - self.last_dump >= self.dump_interval:
+            self.dump(self.dump_path)
+
+    def snapshot(self):
+        """
+        Returns the metrics of every operation.
+
+        Returns:
+            dict: Maps operation names to their calls, total, mean and max latency in
+                milliseconds, and latency histogram.
+        """
+        labels = [f'<={bound}ms' for bound in self.BUCKETS_MS] + [f'>{self.BUCKETS_MS[-1]}ms']
+        return {name: {'calls': calls, 'total_ms': total * 1000, 'mean_ms': total * 1000 / calls,
+                       'max_ms': longest * 1000, 'histogram': dict(zip(labels, histogram))}
+                for name, (calls, total, longest, histogram) in self.operations.items()}
+
+    def dump(self, path):
+        """
+        Writes the metrics returned by report to a JSON file.
+
+        Args:
+            path (str): Path of the file.
+        """
+        self.last_dump = time.monotonic()
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'time': int(time.time()), 'metrics': self.report()}, file, indent=2)
+        os.replace(temp_path, path)
+
+    def reset(self):
+        """
+        Forgets every recorded call.
+        """
+        self.operations = {}
+
+
+def instrumented(method):
+    """
+    Decorates a PhoneBook method so that its calls are recorded in the phone book's metrics.
+
+    Args:
+        method (callable): The method to instrument.
+
+    Returns:
+        callable: The instrumented method.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = self.metrics
+        if not metrics.enabled:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics.observe(name, time.perf_counter() - start)
+    return wrapper
+
+
+def profile(function, *args, output=None, limit=20, **kwargs):
+    """
+    Runs a single call under cProfile and prints the functions taking the most time.
+
+    Args:
+        function (callable): The function to profile.
+        *args: Its positional arguments.
+        output (str, optional): File where the raw profile is saved for later analysis. Defaults to None.
+        limit (int, optional): Number of functions printed. Defaults to 20.
+        **kwargs: Its keyword arguments.
+
+    Returns:
+        The return value of the function.
+    """
+    import cProfile  # Imported on first use, like pstats in print_profile, to keep startup fast.
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        print_profile(profiler, output, limit)
+
+
+def print_profile(profiler, output=None, limit=20):
+    """
+    Prints the functions taking the most cumulative time in a finished profile.
+
+    Args:
+        profiler (cProfile.Profile): The profile.
+        output (str, optional): File where the raw profile is saved. Defaults to None.
+        limit (int, optional): Number of functions printed. Defaults to 20.
+    """
+    import pstats
+    if output:
+        profiler.dump_stats(output)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    print(stream.getvalue())
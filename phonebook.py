@@ -1,104 +1,119 @@
-from datetime import datetime
+from contact import Contact
+from validation import format_phone_number, normalize_phone_number, validate_email, validate_phone_number
+from importer import ImportReport, parse_csv_files, parse_rows
+from exporter import write_contacts
+from duplicates import MAX_BLOCK, find_duplicates
 from utils import green_print, red_print
-import json
+from storage import JsonLinesStorage
+from audit import AuditLog
+from metrics import Metrics, instrumented
+from cache import QueryCache, set_pattern_cache_size
+from query import predicates
+from logging.handlers import RotatingFileHandler
+import csv
+import itertools
+import logging
 
 
-class Contact:
-    def __init__(self, first_name, last_name, phone_number, email="", address="", created_at=None, updated_at=None):
-        """
-        Initializes a new Contact object with the provided details.
+IMPORT_BATCH_ROWS = 10000  # Rows of a CSV file validated together by bulk_import.
 
-        Args:
-            first_name (str): First name of the contact.
-            last_name (str): Last name of the contact.
-            phone_number (str): Phone number in the format (###) ###-####.
-            email (str, optional): Email address of the contact. Defaults to None.
-            address (str, optional): Physical address of the contact. Defaults to None.
-        """
-        self.first_name = first_name
-        self.last_name = last_name
-        self.phone_number = phone_number
-        self.email = email
-        self.address = address
-        self.created_at = created_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        self.updated_at = updated_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    def update(self, first_name=None, last_name=None, phone_number=None, email=None, address=None):
+class PhoneBook:
+    def __init__(self, storage=None, audit_log=None, metrics=None, cache_size=256):
         """
-        Updates contact information and updates the updated_at timestamp.
+        Initializes a new PhoneBook instance, setting up an empty list for contacts
+        and configuring logging for recording operations.
 
         Args:
-            first_name (str, optional): Updated first name.
-            last_name (str, optional): Updated last name.
-            phone_number (str, optional): Updated phone number.
-            email (str, optional): Updated email.
-            address (str, optional): Updated address.
-        """
-        # Only update fields if new values are provided.
-        if first_name:
-            self.first_name = first_name
-        if last_name:
-            self.last_name = last_name
-        if phone_number:
-            self.phone_number = phone_number
-        if email:
-            self.email = email
-        if address:
-            self.address = address
-        self.updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')  # Update the timestamp when any detail is changed.
-
-    def __str__(self):
-        """
-        Returns a string representation of the contact.
+            storage (JsonStorage, optional): Where contacts are kept. Defaults to a
+                JsonLinesStorage rewriting 'contacts.jsonl' on every change; pass a
+                JsonStorage to keep using 'contacts.json', a JournalStorage to append
+                each change to a journal instead, a BinaryStorage to open large phone
+                books from a memory-mapped snapshot, a ShardedStorage to split them into
+                files rewritten one at a time, or an SqliteStorage to keep the
+                contacts in a database rather than in memory.
+            audit_log (AuditLog, optional): Where changes to contacts are recorded for
+                audit_contact. Defaults to an AuditLog in 'audit.jsonl'.
+            metrics (Metrics, optional): Where the calls of the public methods are
+                measured, reported by stats(). Defaults to an enabled Metrics.
+            cache_size (int, optional): Number of search and find_contact results kept
+                until the phone book changes, and of compiled search patterns kept by the
+                process, or 0 to disable both caches. Defaults to 256.
+        """
+        self.cache = QueryCache(cache_size)
+        set_pattern_cache_size(cache_size)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.metrics.report = self.stats  # Periodic dumps include the storage counters.
+        self.storage = storage if storage is not None else JsonLinesStorage()
+        self.audit_log = audit_log if audit_log is not None else AuditLog()
+        self.setup_logging()  # Initialize logging for actions.
+        self.load_contacts()  # Load contacts from file on initialization.
 
-        Returns:
-            str: A formatted string of contact information.
+    @property
+    def contacts(self):
         """
-        return f'{self.first_name} {self.last_name}, {self.phone_number}, {self.email}, {self.address}'
+        Returns the contacts of the phone book in insertion order.
 
+        Returns:
+            list: A list of Contact objects.
+        """
+        self.storage.refresh()  # Pick up the changes made by other processes.
+        return list(self.storage)
 
 
-import csv
-import re
-import logging
+    @instrumented
+    def save_contacts(self):
+        """
+        Saves the contacts through the configured storage, which decides the file format
+        and whether the whole phone book or only the pending changes are written.
+        """
+        self.storage.save()
+        logging.info("Contacts saved to file")
 
-class PhoneBook:
-    def __init__(self):
+    @instrumented
+    def flush(self):
         """
-        Initializes a new PhoneBook instance, setting up an empty list for contacts
-        and configuring logging for recording operations.
+        Writes the changes the storage's background writer has not written yet.
         """
-        self.contacts = []  # List to store Contact objects.
-        self.setup_logging()  # Initialize logging for actions.
-        self.load_contacts()  # Load contacts from file on initialization.
+        self.storage.flush()
 
-        
+    def stats(self):
+        """
+        Reports the metrics collected on the phone book's operations.
 
-    def save_contacts(self):
+        Returns:
+            dict: The call counts and latencies of every public method that was called, the
+                bytes written by the storage, the contacts compared against search terms, and
+                the hits and misses of the search caches.
         """
-        Saves the current list of contacts to a JSON file.
+        operations = self.metrics.snapshot()
+        queries = sum(operations.get(name, {}).get('calls', 0) for name in ('search', 'find_contact'))
+        return {
+            'operations': operations,
+            'bytes_written': self.storage.bytes_written,
+            'contacts_scanned': self.storage.contacts_scanned,
+            'contacts_scanned_per_query': self.storage.contacts_scanned / queries if queries else 0,
+            'cache': self.cache.stats(),
+        }
+
+    def close(self):
         """
-        with open('contacts.json', 'w') as file:
-            json.dump([contact.__dict__ for contact in self.contacts], file, default=str)
-            logging.info("Contacts saved to file")
+        Finishes pending storage work, such as unwritten changes or a journal compaction,
+        and closes the storage and the audit log.
+        """
+        self.storage.close()
+        self.audit_log.close()
 
+    @instrumented
     def load_contacts(self):
         """
-        Loads contacts from a JSON file and initializes the contact list.
+        Loads the contacts from the configured storage, starting with an empty phone book
+        if its file does not exist yet.
         """
         try:
-            with open('contacts.json', 'r') as file:
-                contacts_data = json.load(file)
-                self.contacts = []
-                for data in contacts_data:
-                    # Remove timestamps if you don't want to handle them in the class
-                    data.pop('created_at', None)
-                    data.pop('updated_at', None)
-                    contact = Contact(**data)
-                    self.contacts.append(contact)
-                logging.info("Contacts loaded from file")
+            self.storage.load()
+            logging.info("Contacts loaded from file")
         except FileNotFoundError:
-            self.contacts = []
             logging.info("No contacts file found, starting with an empty list")
 
 
@@ -106,11 +121,14 @@ class PhoneBook:
     def setup_logging(self):
         """
         Configures logging to store application events such as adding, updating, 
-        and deleting contacts in a 'logs.txt' file.
+        and deleting contacts in a 'logs.txt' file, rotated when it reaches 1 MB.
         """
-        logging.basicConfig(filename='logs.txt', level=logging.INFO,
-                            format='%(asctime)s - %(message)s')
+        if logging.getLogger().handlers:
+            return  # Already configured, by an earlier PhoneBook or by the application.
+        logging.basicConfig(handlers=[RotatingFileHandler('logs.txt', maxBytes=1024 * 1024, backupCount=5)],
+                            level=logging.INFO, format='%(asctime)s - %(message)s')
 
+    @instrumented
     def add_contact(self, contact):
         """
         Adds a new contact to the phone book and logs the action.
@@ -118,13 +136,15 @@ class PhoneBook:
         Args:
             contact (Contact): The contact object to be added.
         """
-        
-        if any(c.phone_number == contact.phone_number for c in self.contacts):
+        self.storage.refresh()
+        contact.phone_number = format_phone_number(contact.phone_number)
+        key = normalize_phone_number(contact.phone_number)
+        if key in self.storage:
             red_print(f"Contact with phone number {contact.phone_number} already exists.")
             return
 
-        self.contacts.append(contact)
-        self.save_contacts()
+        self.storage.add(key, contact)
+        self.audit_log.record('add', key, after=contact.to_dict())
         logging.info(f"Contact added: {contact}")
         green_print(f"Contact {contact.first_name} {contact.last_name} added successfully.")
 
@@ -146,37 +166,174 @@ class PhoneBook:
     #             self.add_contact(contact)
     #         logging.info(f"Batch import from {csv_file} completed")
     
+    @instrumented
     def batch_import(self, csv_file):
-        with open(csv_file, mode='r') as file:
+        """
+        Imports contacts from a CSV file and prints a summary of the import.
+
+        Args:
+            csv_file (str): Path to the CSV file containing contacts.
+
+        Returns:
+            ImportReport: The counts of added and skipped rows.
+        """
+        report = self.bulk_import(csv_file)
+        print(report)
+        return report
+
+    @instrumented
+    def bulk_import(self, csv_file):
+        """
+        Imports contacts from a CSV file as a single transaction.
+
+        Rows are streamed from the file, validated and deduplicated in memory against the
+        phone book and against each other. The accepted contacts are then added together
+        and saved with a single write, so nothing is added if reading the file fails.
+
+        Args:
+            csv_file (str): Path to a CSV file with a header row and the columns
+                first_name, last_name, phone_number, email, address.
+
+        Returns:
+            ImportReport: The counts of added and skipped rows.
+        """
+        self.storage.refresh()
+        report = ImportReport()
+        pending = {}  # Contacts accepted so far, keyed by normalized phone number.
+        with open(csv_file, mode='r', newline='') as file:
             reader = csv.reader(file)
-            next(reader)  # Skip the header row.
-            for row in reader:
-                # Ensure no empty values are assigned to any field
-                first_name = row[0] if row[0] else "Unknown"
-                last_name = row[1] if row[1] else "Unknown"
-                phone_number = row[2] if row[2] else None  # Leave None if no phone
-                email = row[3] if row[3] else ""
-                address = row[4] if row[4] else ""
-                
-                if phone_number:  # Add only if phone number is present
-                    contact = Contact(first_name, last_name, phone_number, email, address)
-                    self.add_contact(contact)
+            next(reader, None)  # Skip the header row.
+            # Validate the rows in batches, column by column.
+            for rows in iter(lambda: list(itertools.islice(reader, IMPORT_BATCH_ROWS)), []):
+                for key, fields in parse_rows(rows, report):
+                    if key in self.storage or key in pending:
+                        report.skipped_duplicate += 1
+                        continue
+                    pending[key] = Contact(*fields)
+
+        report.added = len(pending)
+        self.add_imported(pending)
+        logging.info(f"Batch import from {csv_file} completed: {report}")
+        return report
+
+    @instrumented
+    def parallel_import(self, csv_files, processes=None, conflict='first', chunk_bytes=None):
+        """
+        Imports contacts from several CSV files, or from large ones split into byte ranges,
+        parsing and validating the rows in a pool of processes.
+
+        The rows of all files are then merged in a single pass in file and row order, so the
+        outcome does not depend on which worker finishes first. Contacts already in the phone
+        book are always kept; between imported rows with the same phone number, conflict
+        decides which one is added. Everything is saved with a single write.
+
+        Args:
+            csv_files (list): Paths of CSV files with a header row and the columns
+                first_name, last_name, phone_number, email, address.
+            processes (int, optional): Number of worker processes, or 1 to parse in this
+                process. Defaults to the number of CPUs.
+            conflict (str, optional): 'first' to keep the first row of a phone number, or
+                'last' to keep the last one. Defaults to 'first'.
+            chunk_bytes (int, optional): Size of the byte ranges large files are split into.
+                Defaults to importer.CHUNK_BYTES.
+
+        Returns:
+            dict: Maps each file to the ImportReport of its rows; duplicates are counted in
+                the file of the row that was dropped.
+
+        Raises:
+            ValueError: If conflict is neither 'first' nor 'last'.
+        """
+        if conflict not in ('first', 'last'):
+            raise ValueError(f"conflict must be 'first' or 'last', not {conflict!r}")
+        options = {} if chunk_bytes is None else {'chunk_bytes': chunk_bytes}
+        return self.merge_import(csv_files, parse_csv_files(csv_files, processes, **options), conflict)
+
+    @instrumented
+    def merge_import(self, csv_files, results, conflict='first'):
+        """
+        Adds the rows of CSV files parsed by importer.parse_csv_files, the second half of
+        parallel_import, for callers that parse the files elsewhere.
+
+        Args:
+            csv_files (list): Paths of the parsed CSV files.
+            results (iterable): The (file index, rows, report) tuples of parse_csv_files.
+            conflict (str, optional): 'first' or 'last', see parallel_import. Defaults to 'first'.
+
+        Returns:
+            dict: Maps each file to the ImportReport of its rows.
+        """
+        self.storage.refresh()
+        reports = [ImportReport() for _ in csv_files]
+        pending = {}  # Maps normalized phone numbers to the index of their file and their fields.
+        for index, rows, report in results:
+            reports[index].merge(report)
+            for key, fields in rows:
+                if key in self.storage:
+                    reports[index].skipped_duplicate += 1
+                elif key not in pending:
+                    pending[key] = (index, fields)
+                elif conflict == 'first':
+                    reports[index].skipped_duplicate += 1
                 else:
-                    print("Skipping contact with missing phone number")
-            logging.info(f"Batch import from {csv_file} completed")
+                    reports[pending.pop(key)[0]].skipped_duplicate += 1
+                    pending[key] = (index, fields)  # Moved to the end, in the order of the winning row.
 
-            
+        contacts = {}
+        for key, (index, fields) in pending.items():
+            reports[index].added += 1
+            contacts[key] = Contact(*fields)
+        self.add_imported(contacts)
+        for path, report in zip(csv_files, reports):
+            logging.info(f"Parallel import from {path} completed: {report}")
+        return dict(zip(csv_files, reports))
+
+    def add_imported(self, contacts):
+        """
+        Adds the new contacts of an import with a single save and records them in the audit log.
+
+        Args:
+            contacts (dict): Maps normalized phone numbers, not in the phone book yet, to contacts.
+        """
+        if contacts:
+            self.storage.add_many(contacts)
+            logging.info("Contacts saved to file")
+        for key, contact in contacts.items():
+            self.audit_log.record('add', key, after=contact.to_dict())
+            logging.info(f"Contact added: {contact}")
+
+    @instrumented
+    def export_contacts(self, file, format='csv'):
+        """
+        Writes every contact to a CSV file, readable by the imports, or to a JSON lines file.
+
+        Contacts are streamed from the storage one at a time, so exporting a large phone
+        book does not build its text in memory.
+
+        Args:
+            file (file): A text file open for writing; for CSV, opened with newline=''.
+            format (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+
+        Returns:
+            int: The number of contacts exported.
+
+        Raises:
+            ValueError: If the format is not supported.
+        """
+        self.storage.refresh()
+        count = write_contacts(self.storage, file, format)
+        logging.info(f"{count} contacts exported")
+        return count
+
+    @instrumented
     def find_contact_by_phone_number(self, phone_number):
         """
-        Finds a contact by their phone number.
+        Finds a contact by their phone number, ignoring its formatting.
         """
-        for contact in self.contacts:
-            
-            # Check if the entered phone number matches existing phone numbers.
-            if contact.phone_number == phone_number:
-                return contact
-        return None
+        self.storage.refresh()
+        return self.storage.get(normalize_phone_number(phone_number))
 
+    @instrumented
     def find_contact(self, search_term):
         """
         Searches for contacts by name (either first or last) using a regex pattern.
@@ -187,56 +344,138 @@ class PhoneBook:
         Returns:
             list: A list of contacts matching the search term.
         """
-        result = []
-        pattern = re.compile(search_term, re.IGNORECASE)  # Case-insensitive search pattern.
-        for contact in self.contacts:
-            # Check if the search term matches first or last name.
-            if pattern.search(contact.first_name) or pattern.search(contact.last_name) or pattern.search(contact.phone_number):
-                result.append(contact)
-        return result
+        self.storage.refresh()
+        return self.cached_query('find', search_term, self.storage.find)
+
+    def cached_query(self, mode, term, query):
+        """
+        Answers a search from the cache if the phone book has not changed since the same
+        search was last run.
+
+        Args:
+            mode (str): 'search' or 'find'.
+            term (str): The search term.
+            query (callable): Runs the search on the storage.
+
+        Returns:
+            list: The matching contacts.
+        """
+        key = (mode, term)
+        result = self.cache.get(key, self.storage.generation)
+        if result is None:
+            result = query(term)
+            self.cache.put(key, self.storage.generation, result)
+        return list(result)  # A copy, so callers cannot change the cached result.
     
+    @instrumented
     def delete_contact(self, phone_number):
         """
         Deletes a contact from the phonebook.
         """
-        contact = self.find_contact_by_phone_number(phone_number)
+        self.storage.refresh()
+        key = normalize_phone_number(phone_number)
+        contact = self.storage.delete(key)
         if contact:
-            self.contacts.remove(contact)
-            self.save_contacts()
+            self.audit_log.record('delete', key, before=contact.to_dict())
             red_print(f"Contact deleted: {contact.first_name} {contact.last_name}")
         else:
             print("No contact found with this phone number!!!")
 
-    
+
+    @instrumented
+    def find_duplicates(self, min_score=0.5, max_block=MAX_BLOCK):
+        """
+        Suggests contacts to merge: pairs that are likely the same person, such as
+        "Jon Doe" and "John Doe", despite different phone numbers or emails.
+
+        Only contacts sharing a blocking key (the phonetic code of their names, the local
+        part of their email or the end of their phone number) are compared.
+
+        Args:
+            min_score (float, optional): Lowest score, from 0 to 1, of a suggestion. Defaults to 0.5.
+            max_block (int, optional): Blocking keys shared by more contacts are ignored.
+                Defaults to duplicates.MAX_BLOCK.
+
+        Returns:
+            list: (score, contact, other) tuples, most likely duplicates first.
+        """
+        self.storage.refresh()
+        return find_duplicates(self.storage, min_score, max_block)
+
+    @instrumented
+    def merge_duplicates(self, pairs):
+        """
+        Merges pairs of duplicate contacts, such as those suggested by find_duplicates.
+
+        The first contact of each pair is kept, its empty email and address filled from the
+        second one, which is deleted. Pairs whose contacts were already merged away are skipped.
+
+        Args:
+            pairs (iterable): (contact to keep, contact to merge into it) pairs; the
+                (score, contact, other) tuples of find_duplicates are accepted as well.
+
+        Returns:
+            int: The number of contacts merged away.
+        """
+        self.storage.refresh()
+        merged = 0
+        for pair in pairs:
+            keep_key, drop_key = (normalize_phone_number(contact.phone_number) for contact in pair[-2:])
+            keep, drop = self.storage.get(keep_key), self.storage.get(drop_key)
+            if keep is None or drop is None or keep_key == drop_key:
+                continue
+            before = keep.to_dict()
+            keep.update(email=drop.email if not keep.email else None,
+                        address=drop.address if not keep.address else None)
+            self.storage.update(keep_key, keep)
+            self.audit_log.record('update', keep_key, keep_key, before, keep.to_dict())
+            self.storage.delete(drop_key)
+            self.audit_log.record('delete', drop_key, before=drop.to_dict())
+            logging.info(f"Contact merged: {drop} into {keep}")
+            merged += 1
+        return merged
+
+    @instrumented
     def update_contact(self, old_phone_number, new_phone_number=None, first_name=None, last_name=None, email=None, address=None):
         """
         Updates a contact's details.
         """
-        contact = self.find_contact_by_phone_number(old_phone_number)
+        self.storage.refresh()
+        old_key = normalize_phone_number(old_phone_number)
+        contact = self.storage.get(old_key)
         if contact:
+            if new_phone_number:
+                new_phone_number = format_phone_number(new_phone_number)
+            new_key = normalize_phone_number(new_phone_number) if new_phone_number else old_key
+            if new_key != old_key and new_key in self.storage:
+                red_print(f"Contact with phone number {new_phone_number} already exists.")
+                return
+            before = contact.to_dict()
             contact.update(first_name, last_name, new_phone_number, email, address)
-            self.save_contacts()
+            self.storage.update(old_key, contact)
+            self.audit_log.record('update', old_key, new_key, before, contact.to_dict())
             green_print(f"Contact updated successfully.")
         else:
             print(f"No contact found with this phone number!!!")
 
 
 
-    def list_contacts(self, sort_by=None):
+    @instrumented
+    def list_contacts(self, sort_by=None, offset=0, limit=None):
         """
-        Lists all contacts, optionally sorted by a given field.
+        Lists all contacts, or a page of them, optionally sorted by a given field.
 
         Args:
-            sort_by (str, optional): Field to sort by ('first_name' or 'last_name'). Defaults to None.
+            sort_by (str, optional): Field to sort by ('first_name', 'last_name', 'created_at'
+                or 'updated_at'). Defaults to None.
+            offset (int, optional): Number of contacts to skip. Defaults to 0.
+            limit (int, optional): Maximum number of contacts. Defaults to all of them.
 
         Returns:
             list: A list of sorted or unsorted contact objects.
         """
-        if sort_by == 'first_name':
-            return sorted(self.contacts, key=lambda x: x.first_name.lower())  # Sort by first name.
-        elif sort_by == 'last_name':
-            return sorted(self.contacts, key=lambda x: x.last_name.lower())  # Sort by last name.
-        return self.contacts
+        self.storage.refresh()
+        return self.storage.list_contacts(sort_by, offset, limit)
 
     # def search(self, term):
     #     """
@@ -250,28 +489,77 @@ class PhoneBook:
     #     """
     #     return [contact for contact in self.contacts 
     #             if re.search(term, contact.first_name, re.I) or re.search(term, contact.last_name, re.I)]
+    @instrumented
     def search(self, term):
-        return [contact for contact in self.contacts 
-                if (contact.first_name and re.search(term, contact.first_name, re.I)) or
-                (contact.last_name and re.search(term, contact.last_name, re.I))]
+        self.storage.refresh()
+        return self.cached_query('search', term, self.storage.search)
+
+    @instrumented
+    def complete(self, prefix, limit=10):
+        """
+        Suggests completions for a partially typed name or phone number.
+
+        Args:
+            prefix (str): The beginning of a first name, last name or phone number.
+            limit (int, optional): Maximum number of completions. Defaults to 10.
 
+        Returns:
+            list: Up to limit lowercased names or phone number digits, in alphabetical order.
+        """
+        self.storage.refresh()
+        return self.storage.complete(prefix, limit)
+
+    @instrumented
+    def query(self, *criteria, email_domain=None, address=None, created_after=None, created_before=None,
+              updated_after=None, updated_before=None):
+        """
+        Finds the contacts matching every given criterion, using the secondary indexes of
+        the storage: a hash index on email domains, an inverted index on address words and
+        sorted views on the timestamps. The most selective criterion is looked up first.
+
+        For example, everyone at example.com updated in the last week on Oak Avenue:
+        query(email_domain='example.com', address='oak avenue', updated_after=time.time() - 7 * 86400)
+
+        Args:
+            *criteria: Predicates from query.py (EmailDomain, AddressWords, Between), combined
+                with the keyword criteria.
+            email_domain (str, optional): Domain of the email, e.g. 'example.com'.
+            address (str, optional): Words that must all appear in the address, in any order.
+            created_after, created_before, updated_after, updated_before (optional): Bounds
+                of the timestamps, included, as datetimes, seconds since the epoch or local
+                times in the format '%Y-%m-%d %H:%M:%S'.
+
+        Returns:
+            list: The matching contacts in insertion order, or every contact without criteria.
+
+        Raises:
+            ValueError: If address has no words or a time cannot be parsed.
+        """
+        self.storage.refresh()
+        return self.storage.filter(list(criteria) + predicates(email_domain, address, created_after, created_before,
+                                                               updated_after, updated_before))
+
+    @instrumented
     def audit_contact(self, contact):
         """
         Retrieves the log history related to a specific contact for auditing.
 
+        Only the records of this contact are read, through the index of the audit log,
+        including those from before a change of its phone number.
+
         Args:
             contact (Contact): The contact to audit.
 
         Returns:
-            list: A list of log entries related to the contact.
+            list: A list of log entries related to the contact, as dictionaries with the
+                keys 'time', 'id', 'op', 'key', 'new_key', 'before' and 'after'.
         """
-        with open('logs.txt') as log_file:
-            # Return log lines that mention the contact's first or last name.
-            return [line for line in log_file if contact.first_name in line or contact.last_name in line]
+        return self.audit_log.history(normalize_phone_number(contact.phone_number))
 
     def validate_phone_number(self, phone_number):
         """
-        Validates the phone number format to ensure it follows (###) ###-####.
+        Validates the phone number format, accepting (###) ###-#### and the other usual
+        notations, which are stored in that format.
 
         Args:
             phone_number (str): Phone number to validate.
@@ -279,8 +567,7 @@ class PhoneBook:
         Returns:
             bool: True if valid, False otherwise.
         """
-        pattern = r'^\(\d{3}\) \d{3}-\d{4}$'  # Phone number pattern.
-        return re.match(pattern, phone_number)
+        return validate_phone_number(phone_number)
 
     def validate_email(self, email):
         """
@@ -292,5 +579,4 @@ class PhoneBook:
         Returns:
             bool: True if valid, False otherwise.
         """
-        pattern = r'^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w+$'  # Basic email validation pattern.
-        return re.match(pattern, email)
+        return validate_email(email)
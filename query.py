@@ -0,0 +1,180 @@
+from contact import to_timestamp
+from indexes import address_words, email_domain
+from datetime import datetime
+
+
+TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+
+class EmailDomain:
+    def __init__(self, domain):
+        """
+        Initializes a predicate matching the contacts whose email is at a domain, answered
+        by the hash index on email domains.
+
+        Args:
+            domain (str): The domain, with or without a leading '@', e.g. 'example.com'.
+        """
+        self.domain = domain.lstrip('@').strip().lower()
+
+    def estimate(self, storage):
+        return len(storage.domain_index.get(self.domain))
+
+    def candidates(self, storage):
+        return storage.domain_index.get(self.domain)
+
+    def intersect(self, candidates, storage):
+        return candidates & storage.domain_index.get(self.domain)
+
+    def matches(self, contact):
+        return self.domain in email_domain(contact.email)
+
+    def sql(self):
+        return ["lower(substr(email, instr(email, '@') + 1)) = ?"], [self.domain]
+
+
+class AddressWords:
+    def __init__(self, address):
+        """
+        Initializes a predicate matching the contacts whose address contains every word of
+        a text, ignoring case and word order, answered by the inverted index on address words.
+
+        Args:
+            address (str): The words, e.g. 'oak avenue'.
+
+        Raises:
+            ValueError: If the text has no words.
+        """
+        self.words = address_words(address)
+        if not self.words:
+            raise ValueError(f"No words to look up in {address!r}")
+
+    def estimate(self, storage):
+        return min(len(storage.address_index.get(word)) for word in self.words)
+
+    def candidates(self, storage):
+        posting_lists = sorted((storage.address_index.get(word) for word in self.words), key=len)
+        return self.intersect(posting_lists[0], storage)
+
+    def intersect(self, candidates, storage):
+        for word in self.words:
+            candidates = candidates & storage.address_index.get(word)
+        return candidates
+
+    def matches(self, contact):
+        return self.words <= address_words(contact.address)
+
+    def sql(self):
+        # A prefilter only: LIKE also matches inside longer words, which matches() rejects.
+        escaped = [word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') for word in self.words]
+        return ["lower(address) LIKE ? ESCAPE '\\'"] * len(escaped), [f'%{word}%' for word in escaped]
+
+
+class Between:
+    def __init__(self, field, low=None, high=None):
+        """
+        Initializes a predicate matching the contacts created or updated within a time
+        range, answered by binary search in the sorted view of the field.
+
+        Args:
+            field (str): 'created_at' or 'updated_at'.
+            low (optional): Earliest time included, see to_time. Defaults to no bound.
+            high (optional): Latest time included, see to_time. Defaults to no bound.
+
+        Raises:
+            ValueError: If the field is not a timestamp.
+        """
+        if field not in TIMESTAMP_FIELDS:
+            raise ValueError(f"Cannot query a range of {field}")
+        self.field = field
+        self.low = None if low is None else to_time(low)
+        self.high = None if high is None else to_time(high)
+
+    def estimate(self, storage):
+        start, end = storage.sorted_views[self.field].bounds(self.low, self.high)
+        return end - start
+
+    def candidates(self, storage):
+        return set(storage.sorted_views[self.field].range(self.low, self.high))
+
+    def intersect(self, candidates, storage):
+        # Checking each candidate is cheaper than building the set of the whole range.
+        return {contact for contact in candidates if self.matches(contact)}
+
+    def matches(self, contact):
+        value = getattr(contact, self.field)
+        return (self.low is None or value >= self.low) and (self.high is None or value <= self.high)
+
+    def sql(self):
+        clauses, parameters = [], []
+        if self.low is not None:
+            clauses.append(f'{self.field} >= ?')
+            parameters.append(self.low)
+        if self.high is not None:
+            clauses.append(f'{self.field} <= ?')
+            parameters.append(self.high)
+        return clauses, parameters
+
+
+def to_time(value):
+    """
+    Converts a bound of a time range to seconds since the epoch.
+
+    Args:
+        value (datetime, int or str): A datetime, seconds since the epoch, or a local time
+            in the format '%Y-%m-%d %H:%M:%S'.
+
+    Returns:
+        int: Seconds since the epoch.
+    """
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return to_timestamp(value)
+
+
+def predicates(email_domain=None, address=None, created_after=None, created_before=None,
+               updated_after=None, updated_before=None):
+    """
+    Builds the predicates of the given criteria.
+
+    Returns:
+        list: The predicates, empty without criteria.
+    """
+    result = []
+    if email_domain is not None:
+        result.append(EmailDomain(email_domain))
+    if address is not None:
+        result.append(AddressWords(address))
+    if created_after is not None or created_before is not None:
+        result.append(Between('created_at', created_after, created_before))
+    if updated_after is not None or updated_before is not None:
+        result.append(Between('updated_at', updated_after, updated_before))
+    return result
+
+
+def execute(query_predicates, storage):
+    """
+    Finds the contacts matching every predicate with the indexes of a storage.
+
+    The planner estimates how many contacts each predicate selects, from the size of a
+    posting list or the bounds of a range, and starts from the most selective one. The
+    other predicates then intersect its candidates, most selective first, so the cost
+    follows the smallest candidate set rather than the size of the phone book.
+
+    Args:
+        query_predicates (list): At least one predicate.
+        storage (JsonStorage): A storage with a domain_index, an address_index, sorted_views
+            on the timestamps and a trigram_index giving the insertion order.
+
+    Returns:
+        tuple: The list of matching contacts in insertion order, and the number of candidates
+            taken from the most selective index.
+    """
+    plan = sorted(query_predicates, key=lambda predicate: predicate.estimate(storage))
+    candidates = plan[0].candidates(storage)
+    checked = len(candidates)
+    for predicate in plan[1:]:
+        if not candidates:
+            break
+        candidates = predicate.intersect(candidates, storage)
+    return sorted(candidates, key=lambda contact: storage.trigram_index.indexed[contact][0]), checked
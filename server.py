@@ -0,0 +1,370 @@
+"""
+Serves one in-memory PhoneBook over HTTP/JSON on localhost, for tools that would otherwise
+drive the interactive menu or load the contacts file themselves.
+
+Reads are answered directly on the event loop, so they are served concurrently with each
+other. Changes are queued to a single writer task, which applies them one at a time in a
+writer thread, together with their audit records and any reload of the contacts file,
+and the file is written behind by the storage's background thread, never on the loop.
+
+Routes:
+    GET    /contacts?offset=0&limit=20&sort_by=last_name   A page of contacts.
+    POST   /contacts                                        Adds the contact in the body.
+    GET    /contacts/<phone number>                         One contact.
+    PUT    /contacts/<phone number>                         Updates the fields in the body.
+    DELETE /contacts/<phone number>                         Deletes a contact.
+    GET    /search?q=<term>                                 Contacts whose names match a term.
+    POST   /import                                          Imports {"files": [...], "conflict": "first"}.
+    GET    /stats                                           PhoneBook.stats().
+
+Usage:
+    python server.py [--host 127.0.0.1] [--port 8080] [--write-delay 1.0]
+"""
+from contact import Contact
+from importer import parse_csv_files
+from phonebook import PhoneBook
+from storage import SORT_FIELDS, JsonLinesStorage
+from validation import normalize_phone_number, validate_email, validate_phone_number
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import signal
+import sys
+
+
+MAX_BODY_BYTES = 1024 * 1024  # Larger request bodies are rejected.
+CONTACT_FIELDS = ('first_name', 'last_name', 'phone_number', 'email', 'address')
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        """
+        Initializes an error answered to the client with a status and a JSON message.
+
+        Args:
+            status (int): HTTP status code.
+            message (str): Description of the error.
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class PhoneBookServer:
+    def __init__(self, phonebook, host='127.0.0.1', port=8080):
+        """
+        Initializes an HTTP/JSON server over a phone book.
+
+        Args:
+            phonebook (PhoneBook): The phone book served. Its storage should write behind
+                (see JsonStorage's write_delay) so that changes never wait for a save.
+            host (str, optional): Address to listen on. Defaults to '127.0.0.1'.
+            port (int, optional): Port to listen on, or 0 for any free port. Defaults to 8080.
+        """
+        self.phonebook = phonebook
+        self.host = host
+        self.port = port
+        self.server = None
+        self.writes = None  # Queue of (function, arguments, future) applied by the writer task.
+        self.writer_task = None
+        self.writer_thread = None  # Executor of one thread in which the writer task applies changes.
+        self.lock = getattr(phonebook.storage, 'lock', None)  # Held while a change is applied.
+
+    async def start(self):
+        """
+        Starts listening and starts the writer task.
+        """
+        self.writes = asyncio.Queue()
+        self.writer_thread = ThreadPoolExecutor(max_workers=1)
+        self.writer_task = asyncio.create_task(self.apply_writes())
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """
+        Stops listening, lets the queued changes finish, and closes the phone book, writing
+        its pending changes from a worker thread.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        await self.writes.join()
+        self.writer_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.writer_task
+        self.writer_thread.shutdown()
+        await asyncio.get_running_loop().run_in_executor(None, self.phonebook.close)
+
+    async def write(self, function, *args):
+        """
+        Queues a change for the writer task and waits for its result.
+
+        Args:
+            function (callable): Applies the change.
+            *args: Its arguments.
+
+        Returns:
+            The return value of the function.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((function, args, future))
+        return await future
+
+    async def apply_writes(self):
+        """
+        Applies the queued changes one at a time in the writer thread, holding the storage
+        lock so that reads never see a change half applied. A storage without a lock, such
+        as SqliteStorage whose connection belongs to the loop's thread, is changed on the
+        loop instead.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            function, args, future = await self.writes.get()
+            try:
+                if self.lock is None:
+                    result = function(*args)
+                else:
+                    result = await loop.run_in_executor(self.writer_thread, self.apply, function, args)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            self.writes.task_done()
+
+    def apply(self, function, args):
+        """
+        Applies a change in the writer thread, holding the storage lock.
+        """
+        with self.lock:
+            return function(*args)
+
+    async def read(self, function, *args):
+        """
+        Answers a read on the event loop, waiting without blocking it while a change is
+        applied or the background writer saves the contacts.
+
+        Args:
+            function (callable): Answers the read.
+            *args: Its arguments.
+
+        Returns:
+            The return value of the function.
+        """
+        while self.lock is not None and not self.lock.acquire(blocking=False):
+            await asyncio.sleep(0.005)
+        try:
+            return function(*args)
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Answers the requests of one connection, keeping it open between requests.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                    length = int(headers.get('content-length', 0))
+                    if length > MAX_BODY_BYTES:
+                        raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body too large')
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except ValueError:
+                    status, payload = HTTPStatus.BAD_REQUEST, {'error': 'Malformed request'}
+                except Exception:
+                    logging.exception("Request failed")
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': 'Internal error'}
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                data = b'' if payload is None else json.dumps(payload).encode()
+                writer.write(f'HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(data)}\r\nConnection: {"keep-alive" if keep_alive else "close"}'
+                             f'\r\n\r\n'.encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive or status == HTTPStatus.REQUEST_ENTITY_TOO_LARGE:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        """
+        Routes a request to the method answering it.
+
+        Args:
+            method (str): HTTP method.
+            target (str): Path and query string.
+            body (bytes): Request body, JSON for the requests that change contacts.
+
+        Returns:
+            tuple: The HTTP status and the JSON payload of the response, or None for no body.
+
+        Raises:
+            HttpError: If the route does not exist or the request is invalid.
+        """
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        data = json.loads(body) if body else {}
+
+        if parts == ['contacts'] and method == 'GET':
+            return HTTPStatus.OK, await self.read(self.list_contacts, query)
+        if parts == ['contacts'] and method == 'POST':
+            return HTTPStatus.CREATED, await self.write(self.add_contact, data)
+        if len(parts) == 2 and parts[0] == 'contacts':
+            if method == 'GET':
+                return HTTPStatus.OK, await self.read(self.get_contact, parts[1])
+            if method in ('PUT', 'PATCH'):
+                return HTTPStatus.OK, await self.write(self.update_contact, parts[1], data)
+            if method == 'DELETE':
+                await self.write(self.delete_contact, parts[1])
+                return HTTPStatus.NO_CONTENT, None
+        if parts == ['search'] and method == 'GET':
+            return HTTPStatus.OK, await self.read(self.search, query.get('q', ''))
+        if parts == ['import'] and method == 'POST':
+            return HTTPStatus.OK, await self.import_files(data)
+        if parts == ['stats'] and method == 'GET':
+            return HTTPStatus.OK, await self.read(self.phonebook.stats)
+        raise HttpError(HTTPStatus.NOT_FOUND, f'No route for {method} {url.path}')
+
+    def list_contacts(self, query):
+        """
+        Answers a page of contacts.
+        """
+        sort_by = query.get('sort_by')
+        if sort_by is not None and sort_by not in SORT_FIELDS:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f'sort_by must be one of {", ".join(SORT_FIELDS)}')
+        offset, limit = int(query.get('offset', 0)), int(query.get('limit', 20))
+        contacts = self.phonebook.list_contacts(sort_by, offset, limit)
+        return {'total': len(self.phonebook.storage), 'offset': offset,
+                'contacts': [contact.to_dict() for contact in contacts]}
+
+    def get_contact(self, phone_number):
+        """
+        Answers one contact.
+        """
+        contact = self.phonebook.find_contact_by_phone_number(phone_number)
+        if contact is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f'No contact with phone number {phone_number}')
+        return contact.to_dict()
+
+    def search(self, term):
+        """
+        Answers the contacts whose names match a term.
+        """
+        return [contact.to_dict() for contact in self.phonebook.search(term)]
+
+    def check_fields(self, data):
+        """
+        Rejects contact fields that are unknown or invalid.
+        """
+        if not isinstance(data, dict) or set(data) - set(CONTACT_FIELDS):
+            raise HttpError(HTTPStatus.BAD_REQUEST, f'Expected an object with the fields {", ".join(CONTACT_FIELDS)}')
+        if data.get('phone_number') and not validate_phone_number(data['phone_number']):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid phone number')
+        if data.get('email') and not validate_email(data['email']):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid email')
+
+    def add_contact(self, data):
+        """
+        Adds a contact. Runs in the writer thread.
+        """
+        self.check_fields(data)
+        if not data.get('phone_number'):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'A phone number is required')
+        if normalize_phone_number(data['phone_number']) in self.phonebook.storage:
+            raise HttpError(HTTPStatus.CONFLICT, f'Contact with phone number {data["phone_number"]} already exists')
+        contact = Contact(**{field: data.get(field) or '' for field in CONTACT_FIELDS})
+        self.phonebook.add_contact(contact)
+        return contact.to_dict()
+
+    def update_contact(self, phone_number, data):
+        """
+        Updates the fields of a contact. Runs in the writer thread.
+        """
+        self.check_fields(data)
+        self.get_contact(phone_number)
+        new_phone_number = data.get('phone_number')
+        if new_phone_number:
+            new_key = normalize_phone_number(new_phone_number)
+            if new_key != normalize_phone_number(phone_number) and new_key in self.phonebook.storage:
+                raise HttpError(HTTPStatus.CONFLICT, f'Contact with phone number {new_phone_number} already exists')
+        self.phonebook.update_contact(phone_number, new_phone_number, data.get('first_name'),
+                                      data.get('last_name'), data.get('email'), data.get('address'))
+        return self.get_contact(new_phone_number or phone_number)
+
+    def delete_contact(self, phone_number):
+        """
+        Deletes a contact. Runs in the writer thread.
+        """
+        self.get_contact(phone_number)
+        self.phonebook.delete_contact(phone_number)
+
+    async def import_files(self, data):
+        """
+        Imports CSV files from the server's disk. The files are parsed in a pool of processes
+        and only the merge of their rows goes through the writer task.
+        """
+        files, conflict = data.get('files'), data.get('conflict', 'first')
+        if not isinstance(files, list) or not all(isinstance(path, str) for path in files):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Expected {"files": [paths of CSV files]}')
+        if conflict not in ('first', 'last'):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "conflict must be 'first' or 'last'")
+        results = await asyncio.get_running_loop().run_in_executor(None, lambda: list(parse_csv_files(files)))
+        reports = await self.write(self.phonebook.merge_import, files, results, conflict)
+        return {path: {'report': str(report), 'added': report.added, 'errors': report.errors}
+                for path, report in reports.items()}
+
+
+async def serve(phonebook, host, port):
+    """
+    Serves a phone book until interrupted or terminated, then saves it.
+    """
+    server = PhoneBookServer(phonebook, host, port)
+    await server.start()
+    print(f"Serving the phone book on http://{server.host}:{server.port}", file=sys.stderr)
+    stopped = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):  # Not available on Windows.
+            asyncio.get_running_loop().add_signal_handler(signal_number, stopped.set)
+    try:
+        await stopped.wait()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the phone book over HTTP/JSON on localhost.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--write-delay', type=float, default=1.0, help='seconds a change may wait before being saved')
+    args = parser.parse_args()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # The phone book prints confirmations meant for the interactive menu.
+        phonebook = PhoneBook(JsonLinesStorage(write_delay=args.write_delay))
+        asyncio.run(serve(phonebook, args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,429 @@
+"""
+Reads and writes binary snapshots of a phone book, and converts them to and from JSON.
+
+A snapshot is opened with mmap, so opening one costs the same whatever the size of the
+phone book; a contact is decoded from its record only when it is accessed. Layout, all
+integers little-endian:
+
+    header   magic b'PHONEBK\\0', version (uint16), flags (uint16), number of records (uint32),
+             and the file offsets of the string table, the records and the phone index (uint64)
+    strings  the strings of the records, as a uint32 byte length followed by UTF-8 bytes;
+             names and empty strings are stored once and shared by the records using them
+    records  one fixed-width record per contact, in insertion order: the offsets in the string
+             table of its normalized phone number, first name, last name, phone number, email
+             and address (uint32, NO_STRING for None), then created_at and updated_at (int64)
+    index    the record numbers (uint32) sorted by normalized phone number, for binary search
+
+Usage:
+    python snapshot.py import contacts.jsonl contacts.bin
+    python snapshot.py export contacts.bin contacts.json [--lines]
+"""
+from contact import Contact
+from validation import normalize_phone_number
+import argparse
+import json
+import mmap
+import os
+import struct
+from collections.abc import MutableMapping
+
+
+MAGIC = b'PHONEBK\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQQQ')
+RECORD = struct.Struct('<6Iqq')
+INDEX_ENTRY = struct.Struct('<I')
+LENGTH = struct.Struct('<I')
+NO_STRING = 0xFFFFFFFF  # String offset standing for None.
+SHARED_POSITIONS = (1, 2)  # First and last names in a row of write_binary_snapshot, stored once each.
+FIELDS = ('first_name', 'last_name', 'phone_number', 'email', 'address', 'created_at', 'updated_at')
+
+
+class Snapshot:
+    def __init__(self, path):
+        """
+        Opens a snapshot file and maps it into memory. Nothing but the header is read.
+
+        Args:
+            path (str): Path of the snapshot.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            ValueError: If the file is not a snapshot, or of a newer version.
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            # The mapping stays valid after the file is closed, and after the file is replaced.
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b''
+        if len(self.data) < HEADER.size or self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a phone book snapshot")
+        _, version, _, self.count, self.strings_offset, self.records_offset, self.index_offset = \
+            HEADER.unpack_from(self.data)
+        if version > VERSION:
+            self.close()
+            raise ValueError(f"{path} has snapshot version {version}, newer than the supported {VERSION}")
+
+    def __len__(self):
+        return self.count
+
+    def string(self, offset):
+        """
+        Decodes a string of the string table.
+
+        Args:
+            offset (int): Offset of the string in the table, or NO_STRING.
+
+        Returns:
+            str: The string, or None for NO_STRING.
+        """
+        if offset == NO_STRING:
+            return None
+        start = self.strings_offset + offset + LENGTH.size
+        return str(self.data[start:start + LENGTH.unpack_from(self.data, start - LENGTH.size)[0]], 'utf-8')
+
+    def key(self, record):
+        """
+        Returns the normalized phone number of a record.
+
+        Args:
+            record (int): Number of the record.
+
+        Returns:
+            str: The normalized phone number.
+        """
+        return self.string(LENGTH.unpack_from(self.data, self.records_offset + record * RECORD.size)[0])
+
+    def fields(self, record):
+        """
+        Decodes the fields of a record.
+
+        Args:
+            record (int): Number of the record.
+
+        Returns:
+            tuple: The normalized phone number followed by the values of FIELDS.
+        """
+        values = RECORD.unpack_from(self.data, self.records_offset + record * RECORD.size)
+        return tuple(self.string(offset) for offset in values[:6]) + values[6:]
+
+    def contact(self, record):
+        """
+        Decodes the contact of a record.
+
+        Args:
+            record (int): Number of the record.
+
+        Returns:
+            Contact: The contact.
+        """
+        return Contact(*self.fields(record)[1:])
+
+    def find(self, key):
+        """
+        Looks a normalized phone number up in the phone index.
+
+        Args:
+            key (str): Normalized phone number.
+
+        Returns:
+            int: Number of its record, or None if there is none.
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record = INDEX_ENTRY.unpack_from(self.data, self.index_offset + middle * INDEX_ENTRY.size)[0]
+            middle_key = self.key(record)
+            if middle_key == key:
+                return record
+            if middle_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def close(self):
+        """
+        Unmaps the file. Contacts already decoded stay usable.
+        """
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b''
+
+
+class SnapshotIndex(MutableMapping):
+    def __init__(self, snapshot, decoded=None):
+        """
+        Initializes a mapping of normalized phone numbers to contacts, read from a snapshot
+        as they are accessed, that behaves like the phone_index dictionary of JsonStorage.
+
+        Changes are kept in memory on top of the snapshot, in insertion order like a dictionary:
+        a contact replaced keeps its place, and a contact deleted and added again moves to the end.
+
+        Args:
+            snapshot (Snapshot): The snapshot.
+            decoded (dict, optional): Contacts already decoded from it, by normalized phone number.
+        """
+        self.snapshot = snapshot
+        self.decoded = decoded or {}  # Contacts of the snapshot accessed or replaced.
+        self.added = {}  # Contacts added since the snapshot, in insertion order.
+        self.deleted = set()  # Keys of the snapshot deleted since, some of them added again.
+
+    def in_snapshot(self, key):
+        return key not in self.deleted and (key in self.decoded or self.snapshot.find(key) is not None)
+
+    def __getitem__(self, key):
+        if key in self.added:
+            return self.added[key]
+        if key in self.deleted:
+            raise KeyError(key)
+        contact = self.decoded.get(key)
+        if contact is None:
+            record = self.snapshot.find(key)
+            if record is None:
+                raise KeyError(key)
+            contact = self.decoded[key] = self.snapshot.contact(record)
+        return contact
+
+    def __setitem__(self, key, contact):
+        if key not in self.added and self.in_snapshot(key):
+            self.decoded[key] = contact
+        else:
+            self.added[key] = contact
+
+    def __delitem__(self, key):
+        if key in self.added:
+            del self.added[key]
+        elif self.in_snapshot(key):
+            self.deleted.add(key)
+            self.decoded.pop(key, None)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.added or self.in_snapshot(key)
+
+    def __len__(self):
+        return len(self.snapshot) - len(self.deleted) + len(self.added)
+
+    def __iter__(self):
+        return (key for key, _ in self.records())
+
+    def records(self):
+        """
+        Yields the keys of the snapshot still present, in insertion order, then the added ones.
+
+        Yields:
+            tuple: The normalized phone number and the number of its record, or None if added.
+        """
+        for record in range(len(self.snapshot)):
+            key = self.snapshot.key(record)
+            if key not in self.deleted:
+                yield key, record
+        for key in list(self.added):
+            yield key, None
+
+    def items(self):
+        # Walks the records in order instead of looking every key up in the phone index.
+        for key, record in self.records():
+            if record is None:
+                yield key, self.added[key]
+                continue
+            contact = self.decoded.get(key)
+            if contact is None:
+                contact = self.decoded[key] = self.snapshot.contact(record)
+            yield key, contact
+
+    def values(self):
+        return (contact for _, contact in self.items())
+
+    def rows(self):
+        """
+        Yields every contact as the values written to a snapshot, without decoding those
+        that were never accessed into Contact objects.
+
+        Yields:
+            tuple: The normalized phone number followed by the values of FIELDS.
+        """
+        for key, record in self.records():
+            contact = self.added.get(key) if record is None else self.decoded.get(key)
+            if contact is None:
+                yield self.snapshot.fields(record)
+            else:
+                yield (key,) + tuple(getattr(contact, field) for field in FIELDS)
+
+    def materialized(self):
+        """
+        Returns the contacts that were decoded, replaced or added, by normalized phone number.
+        """
+        return {**self.decoded, **self.added}
+
+
+def contact_rows(phone_index):
+    """
+    Returns the rows to write for a phone index.
+
+    Args:
+        phone_index (dict or SnapshotIndex): Maps normalized phone numbers to contacts.
+
+    Returns:
+        iterable: Tuples of the normalized phone number and the values of FIELDS.
+    """
+    if isinstance(phone_index, SnapshotIndex):
+        return phone_index.rows()
+    return ((key,) + tuple(getattr(contact, field) for field in FIELDS) for key, contact in phone_index.items())
+
+
+def write_binary_snapshot(path, rows):
+    """
+    Atomically writes a snapshot.
+
+    Args:
+        path (str): Path of the snapshot.
+        rows (iterable): Tuples of a unique normalized phone number and the values of FIELDS,
+            in insertion order.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    strings = bytearray()
+    string_offsets = {}  # Offsets of the names and empty strings, the values shared by many contacts.
+    records = bytearray()
+    keys = []
+    for row in rows:
+        offsets = []
+        for position, value in enumerate(row[:6]):
+            if value is None:
+                offsets.append(NO_STRING)
+                continue
+            shared = position in SHARED_POSITIONS or not value
+            offset = string_offsets.get(value) if shared else None
+            if offset is None:
+                encoded = value.encode('utf-8')
+                offset = len(strings)
+                if shared:
+                    string_offsets[value] = offset
+                strings += LENGTH.pack(len(encoded))
+                strings += encoded
+            offsets.append(offset)
+        records += RECORD.pack(*offsets, int(row[6]), int(row[7]))
+        keys.append(row[0])
+    if len(strings) >= NO_STRING:
+        raise ValueError("The phone book is too large for a snapshot")
+
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    strings_offset = HEADER.size
+    records_offset = strings_offset + len(strings)
+    index_offset = records_offset + len(records)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, 0, len(keys), strings_offset, records_offset, index_offset))
+        file.write(strings)
+        file.write(records)
+        file.write(struct.pack(f'<{len(order)}I', *order))
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+    os.replace(temp_path, path)
+    return size
+
+
+def read_json_contacts(json_path):
+    """
+    Yields the contacts of a JSON array file or of a line-delimited contacts file.
+
+    Args:
+        json_path (str): Path of the file.
+
+    Yields:
+        dict: The fields of one contact.
+    """
+    with open(json_path, 'r') as file:
+        is_array = file.read(1024).lstrip().startswith('[')
+        file.seek(0)
+        if is_array:
+            yield from json.load(file)
+            return
+        for line in file:
+            if line.strip():
+                data = json.loads(line)
+                data.pop('key', None)
+                yield data
+
+
+def import_json(json_path, snapshot_path):
+    """
+    Converts a JSON or line-delimited contacts file to a snapshot. Contacts with a phone
+    number already seen are skipped, as when a phone book loads the file.
+
+    Args:
+        json_path (str): Path of the JSON file.
+        snapshot_path (str): Path of the snapshot to write.
+
+    Returns:
+        int: The number of contacts written.
+    """
+    phone_index = {}
+    for data in read_json_contacts(json_path):
+        contact = Contact(**data)
+        phone_index.setdefault(normalize_phone_number(contact.phone_number), contact)
+    write_binary_snapshot(snapshot_path, contact_rows(phone_index))
+    return len(phone_index)
+
+
+def export_json(snapshot_path, json_path, lines=False):
+    """
+    Converts a snapshot to a JSON array file, or to a line-delimited contacts file.
+
+    Args:
+        snapshot_path (str): Path of the snapshot.
+        json_path (str): Path of the JSON file to write.
+        lines (bool, optional): Whether to write one contact per line with its 'key', as read
+            by JsonLinesStorage. Defaults to False, for the format of JsonStorage.
+
+    Returns:
+        int: The number of contacts written.
+    """
+    snapshot = Snapshot(snapshot_path)
+    try:
+        temp_path = json_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            if not lines:
+                file.write('[')
+            for record in range(len(snapshot)):
+                values = snapshot.fields(record)
+                data = dict(zip(FIELDS, values[1:]))
+                if lines:
+                    file.write(json.dumps({'key': values[0], **data}) + '\n')
+                else:
+                    file.write((', ' if record else '') + json.dumps(data))
+            if not lines:
+                file.write(']')
+        os.replace(temp_path, json_path)
+        return len(snapshot)
+    finally:
+        snapshot.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert phone book snapshots to and from JSON.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help='convert a JSON or JSON lines file to a snapshot')
+    import_parser.add_argument('json_path')
+    import_parser.add_argument('snapshot_path')
+    export_parser = commands.add_parser('export', help='convert a snapshot to a JSON file')
+    export_parser.add_argument('snapshot_path')
+    export_parser.add_argument('json_path')
+    export_parser.add_argument('--lines', action='store_true', help='write one contact per line, as contacts.jsonl')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        count = import_json(args.json_path, args.snapshot_path)
+        print(f'{count} contacts written to {args.snapshot_path}')
+    else:
+        count = export_json(args.snapshot_path, args.json_path, args.lines)
+        print(f'{count} contacts written to {args.json_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1593 @@
+from cache import compile_pattern
+from contact import Contact
+from validation import normalize_phone_number
+from indexes import AttributeIndex, PrefixTrie, SortedView, TrigramIndex, address_words, completion_key, email_domain
+import contextlib
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from locking import FileLock
+from query import execute
+from snapshot import Snapshot, SnapshotIndex, contact_rows, import_json, read_json_contacts, write_binary_snapshot
+from writer import BackgroundWriter
+
+
+REGEX_SPECIAL_CHARACTERS = set('.^$*+?{}[]\\|()')
+SORT_FIELDS = ('first_name', 'last_name', 'created_at', 'updated_at')
+
+
+def is_literal(term):
+    """
+    Checks whether a search term contains no regex syntax, so that it can be matched as a plain substring.
+
+    Args:
+        term (str): The search term.
+
+    Returns:
+        bool: True if the term has no regex special characters.
+    """
+    return not any(character in REGEX_SPECIAL_CHARACTERS for character in term)
+
+
+def contact_from_data(data):
+    """
+    Creates a Contact from a dictionary read from a JSON file or journal.
+
+    Args:
+        data (dict): The fields of the contact.
+
+    Returns:
+        Contact: The contact.
+    """
+    return Contact(**data)
+
+
+class JsonStorage:
+    def __init__(self, path='contacts.json', write_delay=None, write_batch=100):
+        """
+        Initializes a storage that keeps all contacts in memory and the whole phone book
+        in a single JSON file.
+
+        Every storage provides the same interface, used by PhoneBook for all reads and writes:
+        load, refresh, save, flush, close, get, add, add_many, update, delete, search, find,
+        complete, filter, list_contacts, len(), iter() and the in operator on normalized phone numbers.
+
+        Several processes may share the file. Writes hold an advisory lock on path + '.lock',
+        and a change made by another process is detected by comparing the inode, size and
+        modification time of the file with those seen at the last read or write. Reads then
+        reload the file, and writes first merge the changes made here into it.
+
+        By default every change rewrites the file before returning. With a write_delay, changes
+        are written behind by a BackgroundWriter instead, coalescing bursts into one rewrite.
+
+        Args:
+            path (str, optional): Path of the JSON file. Defaults to 'contacts.json'.
+            write_delay (float, optional): Seconds a change may wait before being written by
+                the background writer. Defaults to None, writing every change immediately.
+            write_batch (int, optional): Number of changes the background writer writes
+                without waiting for the delay. Defaults to 100.
+        """
+        self.path = path
+        self.lock = threading.RLock()  # Held while contacts are changed or saved.
+        self.file_lock = FileLock(path + '.lock')  # Held, with lock, while the file is read or written.
+        self.signature = None  # file_signature() when the file was last read or written.
+        self.changes = {}  # Maps the keys changed since then to their contact, or None if deleted.
+        self.generation = 0  # Bumped by every change, so cached query results can be recognized as stale.
+        self.reloads = 0  # Bumped whenever the contacts are read again as new Contact objects.
+        self.writer = None if write_delay is None else BackgroundWriter(self, write_delay, write_batch)
+        self.phone_index = {}  # Maps normalized phone numbers to Contact objects, in insertion order.
+        self.bytes_written = 0  # Reported by PhoneBook.stats().
+        self.contacts_scanned = 0  # Contacts compared against search terms, reported by PhoneBook.stats().
+        self.trigram_index = TrigramIndex()
+        self.prefix_trie = PrefixTrie()
+        self.sorted_views = {field: SortedView(field) for field in SORT_FIELDS}
+        self.domain_index = AttributeIndex('email', email_domain)
+        self.address_index = AttributeIndex('address', address_words)
+        # Kept current on every change.
+        self.indexes = [self.trigram_index, self.prefix_trie, self.domain_index, self.address_index] + \
+            list(self.sorted_views.values())
+
+    def load(self):
+        """
+        Reads all contacts and builds the indexes over them.
+
+        Raises:
+            FileNotFoundError: If the file does not exist yet. The storage is left empty.
+        """
+        self.flush()  # Changes still pending would otherwise be lost.
+        with self.lock, self.file_lock:
+            self.reload()
+
+    def reload(self):
+        """
+        Reads all contacts, dropping unsaved changes, and builds the indexes over them.
+        Must be called with the locks held.
+
+        Raises:
+            FileNotFoundError: If the file does not exist yet. The storage is left empty.
+        """
+        self.signature = self.file_signature()
+        self.changes = {}
+        self.generation += 1
+        self.reloads += 1
+        self.phone_index = {}
+        try:
+            self.read_contacts()
+        finally:
+            self.build_indexes()
+
+    def file_signature(self):
+        """
+        Returns what changes whenever the file is written: its inode, replaced by each
+        atomic write, its size and its modification time.
+
+        Returns:
+            tuple: The signature, or None if the file does not exist.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def refresh(self):
+        """
+        Catches up with the changes another process made to the file, at the cost of a
+        stat when there are none. Unsaved changes made here are merged and saved.
+
+        Returns:
+            bool: True if the file had changed.
+        """
+        if self.file_signature() == self.signature:
+            return False
+        with self.lock, self.file_lock:
+            if self.file_signature() == self.signature:
+                return False  # Written by this process's own save while waiting for the lock.
+            if self.changes:
+                self.save()
+            else:
+                try:
+                    self.reload()
+                except FileNotFoundError:
+                    pass
+        return True
+
+    def merge(self):
+        """
+        Reloads the file changed by another process and applies the unsaved changes made
+        here on top of it, so the last change of each contact wins. Must be called with the
+        locks held.
+        """
+        changes = self.changes
+        try:
+            self.reload()
+        except FileNotFoundError:
+            pass
+        for key, contact in changes.items():
+            previous = self.phone_index.pop(key, None)
+            if previous is not None and not isinstance(previous, int):
+                for index in self.indexes:
+                    index.remove(previous)
+            if contact is not None:
+                self.phone_index[key] = contact
+                for index in self.indexes:
+                    index.add(contact)
+        self.changes = changes
+
+    def build_indexes(self):
+        """
+        Rebuilds every index from the contacts in phone_index.
+        """
+        for index in self.indexes:
+            index.clear()
+            for contact in self.phone_index.values():
+                index.add(contact)
+
+    def read_contacts(self):
+        """
+        Reads all contacts from the JSON file into phone_index.
+
+        Raises:
+            FileNotFoundError: If the file does not exist yet.
+        """
+        with open(self.path, 'r') as file:
+            contacts_data = json.load(file)
+        for data in contacts_data:
+            contact = contact_from_data(data)
+            self.phone_index.setdefault(normalize_phone_number(contact.phone_number), contact)
+
+    def save(self):
+        """
+        Writes all contacts to the file while holding the file lock, first merging them into
+        the file if another process changed it.
+        """
+        with self.lock, self.file_lock:
+            if self.file_signature() != self.signature:
+                self.merge()
+            self.write()
+            self.changes = {}
+            self.signature = self.file_signature()
+
+    def write(self):
+        """
+        Writes all contacts to the JSON file.
+
+        The contacts are written to a temporary file which then replaces the JSON file,
+        so an interrupted save never leaves a truncated file behind.
+        """
+        self.bytes_written += write_snapshot(self.path, [contact.to_dict() for contact in self.phone_index.values()])
+
+    def track(self, operation, key, contact):
+        """
+        Remembers a change until it is saved, to merge it if another process changes the file.
+
+        Args:
+            operation (str): 'add', 'update' or 'delete'.
+            key (str): Normalized phone number of the contact before the change.
+            contact (Contact): The contact after the change, or None for 'delete'.
+        """
+        if contact is None:
+            self.changes[key] = None
+            return
+        new_key = normalize_phone_number(contact.phone_number)
+        if new_key != key:
+            self.changes[key] = None
+        self.changes[new_key] = contact
+
+    def record(self, operation, key, contact):
+        """
+        Persists a single change to the phone book. The JSON file has no way to store
+        a change on its own, so the whole phone book is rewritten, now or by the
+        background writer.
+
+        Args:
+            operation (str): 'add', 'update' or 'delete'.
+            key (str): Normalized phone number of the contact before the change.
+            contact (Contact): The contact after the change, or None for 'delete'.
+        """
+        self.track(operation, key, contact)
+        if self.writer is not None:
+            self.writer.mark_dirty()
+        else:
+            self.save()
+
+    def flush(self):
+        """
+        Writes the changes left to the background writer, if any.
+        """
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        """
+        Writes pending changes and releases any resources held by the storage.
+        """
+        if self.writer is not None:
+            self.writer.close()
+
+    def __len__(self):
+        return len(self.phone_index)
+
+    def __iter__(self):
+        return iter(self.phone_index.values())
+
+    def __contains__(self, key):
+        return key in self.phone_index
+
+    def get(self, key):
+        """
+        Finds a contact by its normalized phone number.
+
+        Args:
+            key (str): Normalized phone number.
+
+        Returns:
+            Contact: The contact, or None if there is none.
+        """
+        return self.phone_index.get(key)
+
+    def add(self, key, contact):
+        """
+        Adds a contact whose normalized phone number is not in the storage yet.
+
+        Args:
+            key (str): Normalized phone number of the contact.
+            contact (Contact): The contact to add.
+        """
+        with self.lock:
+            self.generation += 1
+            self.phone_index[key] = contact
+            for index in self.indexes:
+                index.add(contact)
+            self.record('add', key, contact)
+
+    def add_many(self, contacts):
+        """
+        Adds several new contacts and saves them together.
+
+        Args:
+            contacts (dict): Maps normalized phone numbers, not in the storage yet, to contacts.
+        """
+        with self.lock:
+            self.generation += 1
+            self.phone_index.update(contacts)
+            for index in self.indexes:
+                for contact in contacts.values():
+                    index.add(contact)
+            self.changes.update(contacts)
+            if self.writer is not None:
+                self.writer.mark_dirty(len(contacts))
+            else:
+                self.save()
+
+    def update(self, old_key, contact):
+        """
+        Stores a contact that was changed in place, moving it if its phone number changed.
+
+        Args:
+            old_key (str): Normalized phone number of the contact before the change.
+            contact (Contact): The changed contact.
+        """
+        new_key = normalize_phone_number(contact.phone_number)
+        with self.lock:
+            self.generation += 1
+            if new_key != old_key:
+                # Re-key the index so lookups by the new number find the contact.
+                del self.phone_index[old_key]
+                self.phone_index[new_key] = contact
+            for index in self.indexes:
+                index.update(contact)
+            self.record('update', old_key, contact)
+
+    def delete(self, key):
+        """
+        Removes a contact by its normalized phone number.
+
+        Args:
+            key (str): Normalized phone number.
+
+        Returns:
+            Contact: The removed contact, or None if there is none.
+        """
+        with self.lock:
+            contact = self.phone_index.pop(key, None)
+            if contact:
+                self.generation += 1
+                for index in self.indexes:
+                    index.remove(contact)
+                self.record('delete', key, None)
+        return contact
+
+    def search(self, term):
+        """
+        Searches for contacts whose first or last name matches a regex, ignoring case.
+
+        Plain substrings of three characters or more are answered by the trigram index;
+        other terms are matched against every contact.
+
+        Args:
+            term (str): The regex to search for.
+
+        Returns:
+            list: A list of matching contacts.
+        """
+        if len(term) >= 3 and is_literal(term):
+            matches, checked = self.trigram_index.search(term, ('first_name', 'last_name'))
+            self.contacts_scanned += checked
+            return matches
+        self.contacts_scanned += len(self.phone_index)
+        pattern = compile_pattern(term)
+        return [contact for contact in self.phone_index.values()
+                if (contact.first_name and pattern.search(contact.first_name)) or
+                (contact.last_name and pattern.search(contact.last_name))]
+
+    def find(self, term):
+        """
+        Searches for contacts whose first name, last name or phone number matches a regex, ignoring case.
+
+        Args:
+            term (str): The regex to search for.
+
+        Returns:
+            list: A list of matching contacts.
+        """
+        if len(term) >= 3 and is_literal(term):
+            matches, checked = self.trigram_index.search(term, ('first_name', 'last_name', 'phone_number'))
+            self.contacts_scanned += checked
+            return matches
+        self.contacts_scanned += len(self.phone_index)
+        pattern = compile_pattern(term)
+        return [contact for contact in self.phone_index.values()
+                if pattern.search(contact.first_name) or pattern.search(contact.last_name) or pattern.search(contact.phone_number)]
+
+    def complete(self, prefix, limit=10):
+        """
+        Lists the first names, last names and phone number digits starting with a prefix.
+
+        Args:
+            prefix (str): The beginning of a name or phone number.
+            limit (int, optional): Maximum number of completions. Defaults to 10.
+
+        Returns:
+            list: Up to limit lowercased names or phone numbers, in alphabetical order.
+        """
+        return self.prefix_trie.complete(completion_key(prefix), limit)
+
+    def filter(self, predicates):
+        """
+        Finds the contacts matching every predicate of a query, see query.execute.
+
+        Args:
+            predicates (list): The predicates, built by query.predicates.
+
+        Returns:
+            list: The matching contacts, in insertion order.
+        """
+        if not predicates:
+            return list(self)
+        matches, checked = execute(predicates, self)
+        self.contacts_scanned += checked
+        return matches
+
+    def list_contacts(self, sort_by=None, offset=0, limit=None):
+        """
+        Lists a page of contacts, optionally sorted by a given field.
+
+        Sorted pages are sliced from sorted views kept up to date on every change, so
+        listing a page costs the size of the page rather than a sort of the phone book.
+
+        Args:
+            sort_by (str, optional): Field to sort by ('first_name', 'last_name', 'created_at'
+                or 'updated_at'). Defaults to None, for insertion order.
+            offset (int, optional): Number of contacts to skip. Defaults to 0.
+            limit (int, optional): Maximum number of contacts. Defaults to all of them.
+
+        Returns:
+            list: A list of sorted or unsorted contact objects.
+        """
+        if sort_by in self.sorted_views:
+            return self.sorted_views[sort_by].page(offset, limit)
+        end = None if limit is None else offset + limit
+        return list(itertools.islice(iter(self), offset, end))
+
+
+class JournalStorage(JsonStorage):
+    def __init__(self, path='contacts.json', journal_path=None, compact_every=1000, fsync=True):
+        """
+        Initializes a storage that appends every change to a journal file next to a JSON snapshot.
+
+        Each add, update or delete costs one appended line, whatever the size of the phone
+        book. Once the journal holds compact_every records, a new snapshot is written by a
+        background thread and the journal is truncated. On load, the journal is replayed over
+        the last snapshot.
+
+        Args:
+            path (str, optional): Path of the JSON snapshot. Defaults to 'contacts.json'.
+            journal_path (str, optional): Path of the journal. Defaults to path + '.journal'.
+            compact_every (int, optional): Number of journal records that triggers a compaction.
+            fsync (bool, optional): Whether each record is flushed to disk before returning.
+        """
+        super().__init__(path)
+        self.journal_path = journal_path or path + '.journal'
+        self.compacting_path = self.journal_path + '.compacting'
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.journal_file = None
+        self.journal_records = 0
+        self.compaction_thread = None
+
+    def read_contacts(self):
+        """
+        Reads the last snapshot into phone_index and replays the journal over it.
+
+        Raises:
+            FileNotFoundError: If neither a snapshot nor a journal exists yet.
+        """
+        try:
+            super().read_contacts()
+        except FileNotFoundError:
+            if not os.path.exists(self.journal_path) and not os.path.exists(self.compacting_path):
+                raise
+
+        # A journal left by an interrupted compaction is older than the current journal.
+        # Replaying it again over a snapshot that already contains it is harmless.
+        self.journal_records = 0
+        for journal_path in (self.compacting_path, self.journal_path):
+            for record in self.read_journal(journal_path):
+                if record['op'] == 'delete':
+                    self.phone_index.pop(record['key'], None)
+                    continue
+                contact = contact_from_data(record['contact'])
+                new_key = normalize_phone_number(contact.phone_number)
+                if new_key != record['key']:
+                    self.phone_index.pop(record['key'], None)
+                # An update in place keeps the contact's position, as it does in memory.
+                self.phone_index[new_key] = contact
+                if journal_path == self.journal_path:
+                    self.journal_records += 1
+
+    def read_journal(self, journal_path):
+        """
+        Yields the records of a journal file, stopping at a record torn by a crash.
+
+        Args:
+            journal_path (str): Path of the journal file.
+
+        Yields:
+            dict: One journal record.
+        """
+        try:
+            with open(journal_path, 'r') as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        logging.info(f"Ignoring incomplete record at the end of {journal_path}")
+                        return
+        except FileNotFoundError:
+            return
+
+    def file_signature(self):
+        """
+        Returns the signatures of the snapshot and of the journal, see JsonStorage.
+
+        Returns:
+            tuple: The two signatures, each None if its file does not exist.
+        """
+        try:
+            stat = os.stat(self.journal_path)
+            journal_signature = stat.st_ino, stat.st_size, stat.st_mtime_ns
+        except FileNotFoundError:
+            journal_signature = None
+        return super().file_signature(), journal_signature
+
+    def write(self):
+        """
+        Writes a full snapshot of the contacts and empties the journal. A running compaction
+        is superseded: its journal is removed here, so its snapshot is discarded.
+        """
+        super().write()
+        self.close_journal()
+        for journal_path in (self.journal_path, self.compacting_path):
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+        self.journal_records = 0
+
+    def record(self, operation, key, contact):
+        """
+        Appends a single change to the journal, compacting it when it has grown too long.
+
+        Args:
+            operation (str): 'add', 'update' or 'delete'.
+            key (str): Normalized phone number of the contact before the change.
+            contact (Contact): The contact after the change, or None for 'delete'.
+        """
+        record = {'op': operation, 'key': key}
+        if contact is not None:
+            record['contact'] = contact.to_dict()
+        line = json.dumps(record, default=str) + '\n'
+        with self.lock, self.file_lock:
+            self.track(operation, key, contact)
+            if self.file_signature() != self.signature:
+                self.close_journal()  # Another process may have moved the journal away.
+                self.merge()
+            if self.journal_file is None:
+                self.journal_file = open(self.journal_path, 'a')
+            self.journal_file.write(line)
+            self.bytes_written += len(line)
+            self.journal_file.flush()
+            if self.fsync:
+                os.fsync(self.journal_file.fileno())
+            self.journal_records += 1
+
+            if self.journal_records >= self.compact_every:
+                self.compact()
+            self.changes = {}
+            self.signature = self.file_signature()
+
+    def compact(self, wait=False):
+        """
+        Starts writing a new snapshot in a background thread and truncates the journal.
+
+        The current journal is set aside until the snapshot is written, so new changes
+        keep going to a fresh journal in the meantime.
+
+        Args:
+            wait (bool, optional): Whether to wait for the snapshot to be written. Only
+                possible without holding the locks, which the compaction thread takes.
+        """
+        with self.lock, self.file_lock:
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                return  # The previous compaction has not finished yet, try again on a later change.
+            if os.path.exists(self.compacting_path):
+                return  # Left over by an interrupted compaction; the next full save removes it.
+
+            # Copy the contacts now, as they keep changing while the snapshot is written.
+            contacts_data = [contact.to_dict() for contact in self.phone_index.values()]
+            self.close_journal()
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.compacting_path)
+            self.journal_records = 0
+
+            self.compaction_thread = threading.Thread(target=self.write_compacted_snapshot, args=(contacts_data,))
+            self.compaction_thread.start()
+        if wait:
+            self.wait_for_compaction()
+
+    def write_compacted_snapshot(self, contacts_data):
+        """
+        Writes the snapshot of a compaction and deletes the journal it replaces.
+
+        The snapshot is written aside without holding the locks, then moved into place with
+        them held. The signature is recorded again so that refresh does not mistake this
+        snapshot for a change made by another process, unless one was already pending.
+
+        Args:
+            contacts_data (list): A list of dictionaries, one per contact.
+        """
+        compacted_path = self.path + '.compacted'
+        self.bytes_written += write_snapshot(compacted_path, contacts_data)
+        with self.lock, self.file_lock:
+            if not os.path.exists(self.compacting_path):
+                os.remove(compacted_path)  # A full save has superseded this compaction.
+                return
+            unchanged = self.file_signature() == self.signature
+            os.replace(compacted_path, self.path)
+            os.remove(self.compacting_path)
+            if unchanged:
+                self.signature = self.file_signature()
+        logging.info("Contacts journal compacted")
+
+    def wait_for_compaction(self):
+        """
+        Blocks until a running compaction has finished.
+        """
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+            self.compaction_thread = None
+
+    def close_journal(self):
+        """
+        Closes the journal file if it is open.
+        """
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+    def close(self):
+        """
+        Writes pending changes, waits for a running compaction and closes the journal file.
+        """
+        super().close()
+        self.wait_for_compaction()
+        self.close_journal()
+
+
+class JsonLinesStorage(JsonStorage):
+    KEY_PREFIX = b'{"key": "'
+
+    def __init__(self, path='contacts.jsonl', legacy_path='contacts.json', lazy=False, write_delay=None, write_batch=100):
+        """
+        Initializes a storage that keeps the phone book in a file with one JSON contact per line.
+
+        The file is read line by line, so loading never holds the whole file in memory. In lazy
+        mode, loading only slices the phone number key out of the start of every line and
+        records its file offset; contacts are parsed when first accessed, and the search
+        indexes are built on the first search.
+
+        A contacts.json file from older versions is converted the first time the storage is
+        loaded and renamed to contacts.json.migrated.
+
+        Args:
+            path (str, optional): Path of the contacts file. Defaults to 'contacts.jsonl'.
+            legacy_path (str, optional): Path of a JSON file to migrate. Defaults to 'contacts.json'.
+            lazy (bool, optional): Whether to parse contacts only when accessed. Defaults to False.
+            write_delay (float, optional): See JsonStorage. Defaults to None.
+            write_batch (int, optional): See JsonStorage. Defaults to 100.
+        """
+        super().__init__(path, write_delay, write_batch)
+        self.legacy_path = legacy_path
+        self.lazy = lazy
+        self.file = None  # Open while contacts remain to be parsed from it.
+        self.deferred_indexes = []
+
+    def read_contacts(self):
+        """
+        Reads the phone number keys, and unless lazy the contacts, from the file into phone_index.
+
+        Raises:
+            FileNotFoundError: If neither the file nor a file to migrate exists yet.
+        """
+        if not os.path.exists(self.path) and self.legacy_path and os.path.exists(self.legacy_path):
+            self.migrate()
+        if not self.lazy:
+            for key, contact in read_contact_lines(self.path):
+                self.phone_index.setdefault(key, contact)
+            return
+
+        self.close_file()
+        self.file = open(self.path, 'rb')
+        offset = 0
+        key_start = len(self.KEY_PREFIX)
+        for line in self.file:
+            if line.startswith(self.KEY_PREFIX):
+                # Offsets stand in for the contacts until they are parsed.
+                self.phone_index.setdefault(line[key_start:line.index(b'"', key_start)].decode(), offset)
+            offset += len(line)
+
+    def migrate(self):
+        """
+        Converts the JSON file of older versions to the line-delimited format.
+        """
+        with open(self.legacy_path, 'r') as file:
+            contacts_data = json.load(file)
+        for data in contacts_data:
+            contact = contact_from_data(data)
+            self.phone_index.setdefault(normalize_phone_number(contact.phone_number), contact)
+        self.save()
+        os.replace(self.legacy_path, self.legacy_path + '.migrated')
+        self.phone_index = {}
+        logging.info(f"Contacts migrated from {self.legacy_path} to {self.path}")
+
+    def build_indexes(self):
+        """
+        Builds the indexes now, or on the first search in lazy mode.
+        """
+        if self.lazy:
+            if self.indexes:  # Already deferred by an earlier reload before the first search.
+                self.deferred_indexes, self.indexes = self.indexes, []
+        else:
+            super().build_indexes()
+
+    def ensure_indexes(self):
+        """
+        Parses every contact and builds the indexes deferred by a lazy load.
+        """
+        if self.deferred_indexes:
+            self.materialize_all()
+            self.indexes, self.deferred_indexes = self.deferred_indexes, []
+            super().build_indexes()
+
+    def materialize(self, key):
+        """
+        Returns the contact stored under a key, parsing it from the file if needed.
+
+        Args:
+            key (str): Normalized phone number present in phone_index.
+
+        Returns:
+            Contact: The contact.
+        """
+        contact = self.phone_index[key]
+        if isinstance(contact, int):
+            with self.lock:  # The background writer may be reopening the file.
+                contact = self.phone_index[key]
+                if isinstance(contact, int):
+                    self.file.seek(contact)
+                    contact = parse_contact_line(self.file.readline())[1]
+                    self.phone_index[key] = contact
+        return contact
+
+    def materialize_all(self):
+        """
+        Parses every contact that has not been accessed yet.
+        """
+        for key in self.phone_index:
+            self.materialize(key)
+
+    def write(self):
+        """
+        Writes all contacts to the file, one per line.
+
+        Contacts that were never parsed are copied from the old file as they are.
+        """
+        offsets = {}
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            for key, contact in self.phone_index.items():
+                if isinstance(contact, int):
+                    self.file.seek(contact)
+                    line = self.file.readline()
+                    offsets[key] = file.tell()
+                else:
+                    line = (json.dumps({'key': key, **contact.to_dict()}) + '\n').encode()
+                file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+            self.bytes_written += file.tell()
+        os.replace(temp_path, self.path)
+
+        self.close_file()
+        if offsets:
+            # Point the contacts not parsed yet at their lines in the new file.
+            self.file = open(self.path, 'rb')
+            self.phone_index.update(offsets)
+
+    def close_file(self):
+        """
+        Closes the contacts file kept open for lazy parsing.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        """
+        Writes pending changes and closes the contacts file.
+        """
+        super().close()
+        self.close_file()
+
+    def __iter__(self):
+        return (self.materialize(key) for key in list(self.phone_index))
+
+    def get(self, key):
+        if key not in self.phone_index:
+            return None
+        return self.materialize(key)
+
+    def delete(self, key):
+        if key in self.phone_index:
+            self.materialize(key)
+        return super().delete(key)
+
+    def search(self, term):
+        self.ensure_indexes()
+        return super().search(term)
+
+    def find(self, term):
+        self.ensure_indexes()
+        return super().find(term)
+
+    def complete(self, prefix, limit=10):
+        self.ensure_indexes()
+        return super().complete(prefix, limit)
+
+    def filter(self, predicates):
+        self.ensure_indexes()
+        return super().filter(predicates)
+
+    def list_contacts(self, sort_by=None, offset=0, limit=None):
+        if sort_by in self.sorted_views:
+            self.ensure_indexes()
+        return super().list_contacts(sort_by, offset, limit)
+
+
+class BinaryStorage(JsonLinesStorage):
+    def __init__(self, path='contacts.bin', legacy_path='contacts.jsonl', write_delay=None, write_batch=100):
+        """
+        Initializes a storage that keeps the phone book in a binary snapshot (see snapshot.py).
+
+        Loading maps the snapshot into memory without reading it, so opening a phone book
+        costs the same whatever its size. Lookups by phone number binary-search the phone
+        index of the snapshot, a contact is decoded the first time it is accessed, and as
+        in lazy JsonLinesStorage the search indexes are built on the first search.
+
+        A JSON or line-delimited file at legacy_path, by default the file of the default
+        JsonLinesStorage, is converted the first time the storage is loaded and renamed with
+        a .migrated suffix.
+
+        Args:
+            path (str, optional): Path of the snapshot. Defaults to 'contacts.bin'.
+            legacy_path (str, optional): Path of a JSON or line-delimited file to migrate.
+                Defaults to 'contacts.jsonl'.
+            write_delay (float, optional): See JsonStorage. Defaults to None.
+            write_batch (int, optional): See JsonStorage. Defaults to 100.
+        """
+        super().__init__(path, legacy_path, True, write_delay, write_batch)
+        self.snapshot = None
+
+    def read_contacts(self):
+        """
+        Maps the snapshot and makes phone_index read the contacts from it.
+
+        Raises:
+            FileNotFoundError: If neither the snapshot nor a file to migrate exists yet.
+        """
+        if not os.path.exists(self.path) and self.legacy_path and os.path.exists(self.legacy_path):
+            self.migrate()
+        self.close_file()
+        self.snapshot = Snapshot(self.path)
+        self.phone_index = SnapshotIndex(self.snapshot)
+
+    def migrate(self):
+        """
+        Converts a JSON or line-delimited file to a snapshot.
+        """
+        import_json(self.legacy_path, self.path)
+        os.replace(self.legacy_path, self.legacy_path + '.migrated')
+        logging.info(f"Contacts migrated from {self.legacy_path} to {self.path}")
+
+    def materialize(self, key):
+        return self.phone_index[key]
+
+    def materialize_all(self):
+        for _ in self.phone_index.values():
+            pass
+
+    def write(self):
+        """
+        Writes all contacts to a new snapshot and maps it, keeping the contacts already decoded.
+
+        Contacts that were never decoded are copied from the old snapshot as they are.
+        """
+        self.bytes_written += write_binary_snapshot(self.path, contact_rows(self.phone_index))
+        if isinstance(self.phone_index, SnapshotIndex):
+            decoded = self.phone_index.materialized()
+        else:
+            decoded = dict(self.phone_index)
+        self.close_file()
+        self.snapshot = Snapshot(self.path)
+        self.phone_index = SnapshotIndex(self.snapshot, decoded)
+
+    def close_file(self):
+        """
+        Unmaps the snapshot.
+        """
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+    def __iter__(self):
+        return iter(self.phone_index.values())
+
+    def get(self, key):
+        return self.phone_index.get(key)
+
+
+class ShardedStorage:
+    SHARD_SUFFIX = '.jsonl'
+
+    def __init__(self, directory='contacts', shard_count=None, legacy_path='contacts.jsonl', lazy=False,
+                 workers=None, write_delay=None, write_batch=100):
+        """
+        Initializes a storage that partitions the phone book into shards, each a JsonLinesStorage
+        in its own file, so that a change rewrites only the shard of the contact.
+
+        Contacts are sharded by the area code of their normalized phone number, in files named
+        after it ('613.jsonl'; numbers without an area code go to 'other.jsonl'), or with a
+        shard_count by a hash of the number ('hash-7.jsonl'). A directory must always be opened
+        with the same shard_count.
+
+        Shards are loaded in parallel by a thread pool, all of them on load, or in lazy mode
+        only when needed: a lookup by phone number loads its shard alone, while searches,
+        listings and len() load every shard. The search indexes and sorted views are kept
+        for all shards together rather than per shard. Several processes may share the directory, as
+        each shard locks and merges its file like JsonStorage; a shard file is always replaced
+        as a whole, so refresh only checks each shard when the directory itself has changed.
+        Changes hold a lock on the directory while their shard is written, so that the changes
+        this process writes itself are not mistaken for another's (those left to a background
+        writer still are, once per batch).
+
+        A line-delimited or JSON file at legacy_path is split into shards the first time the
+        storage is loaded, and renamed with a .migrated suffix.
+
+        Args:
+            directory (str, optional): Directory of the shard files. Defaults to 'contacts'.
+            shard_count (int, optional): Number of hash shards. Defaults to None, for area codes.
+            legacy_path (str, optional): Path of a file to migrate. Defaults to 'contacts.jsonl'.
+            lazy (bool, optional): Whether to load shards only when needed. Defaults to False.
+            workers (int, optional): Threads loading shards. Defaults to the executor's default.
+            write_delay (float, optional): See JsonStorage. Defaults to None.
+            write_batch (int, optional): See JsonStorage. Defaults to 100.
+        """
+        self.directory = directory
+        self.shard_count = shard_count
+        self.legacy_path = legacy_path
+        self.lazy = lazy
+        self.workers = workers
+        self.write_delay = write_delay
+        self.write_batch = write_batch
+        self.shards = {}  # Maps the names of the loaded shards to their storage.
+        self.all_loaded = False  # Whether every shard file in the directory is loaded.
+        self.directory_signature = None  # Modification time of the directory when last checked or written by this process.
+        self.lock = threading.RLock()  # Held, around directory_lock, while a change is written.
+        self.directory_lock = FileLock(os.path.join(directory, '.lock'))
+        self.generation_base = 0  # Keeps generation growing when shards are reloaded or found.
+        self.contacts_scanned = 0  # Contacts compared against search terms, reported by PhoneBook.stats().
+        # The indexes cover every shard, as searching hundreds of small indexes would cost more
+        # than searching one. They are built on the first query that needs them.
+        self.trigram_index = TrigramIndex()
+        self.prefix_trie = PrefixTrie()
+        self.sorted_views = {field: SortedView(field) for field in SORT_FIELDS}
+        self.domain_index = AttributeIndex('email', email_domain)
+        self.address_index = AttributeIndex('address', address_words)
+        self.indexes = [self.trigram_index, self.prefix_trie, self.domain_index, self.address_index] + \
+            list(self.sorted_views.values())
+        self.indexed_reloads = None  # Total reloads of the shards when the indexes were built, or None.
+
+    @property
+    def generation(self):
+        return self.generation_base + sum(shard.generation for shard in self.shards.values())
+
+    @property
+    def bytes_written(self):
+        return sum(shard.bytes_written for shard in self.shards.values())
+
+    def shard_name(self, key):
+        """
+        Returns the name of the shard a contact belongs to.
+
+        Args:
+            key (str): Normalized phone number.
+
+        Returns:
+            str: The name of the shard.
+        """
+        if self.shard_count:
+            return f'hash-{zlib.crc32(key.encode()) % self.shard_count}'
+        return key[:3] if len(key) == 10 else 'other'
+
+    def is_shard_name(self, name):
+        """
+        Checks whether a name is one shard_name can return.
+        """
+        if self.shard_count:
+            prefix, _, index = name.partition('-')
+            return prefix == 'hash' and index.isdigit() and int(index) < self.shard_count
+        return name == 'other' or (len(name) == 3 and name.isdigit())
+
+    def shard_names(self):
+        """
+        Lists the shards that have a file in the directory.
+
+        Returns:
+            list: The names of the shards.
+        """
+        names = []
+        for file_name in os.listdir(self.directory):
+            name = file_name[:-len(self.SHARD_SUFFIX)]
+            if file_name.endswith(self.SHARD_SUFFIX) and self.is_shard_name(name):
+                names.append(name)
+        return names
+
+    def directory_changed(self):
+        """
+        Checks whether a file was created, replaced or removed in the directory since the last call.
+        """
+        signature = os.stat(self.directory).st_mtime_ns
+        changed, self.directory_signature = signature != self.directory_signature, signature
+        return changed
+
+    @contextlib.contextmanager
+    def writing(self):
+        """
+        Holds the directory lock around a change, then records the modification time of
+        the directory again, unless another process had changed it before.
+        """
+        with self.lock, self.directory_lock:
+            unchanged = os.stat(self.directory).st_mtime_ns == self.directory_signature
+            yield
+            if unchanged:
+                self.directory_signature = os.stat(self.directory).st_mtime_ns
+
+    def open_shard(self, name):
+        """
+        Creates and loads the storage of a shard.
+
+        Args:
+            name (str): The name of the shard.
+
+        Returns:
+            JsonLinesStorage: The storage, empty if the shard has no file yet.
+        """
+        storage = JsonLinesStorage(os.path.join(self.directory, name + self.SHARD_SUFFIX), legacy_path=None,
+                                   write_delay=self.write_delay, write_batch=self.write_batch)
+        storage.indexes = []  # Contacts are indexed across shards instead.
+        try:
+            storage.load()
+        except FileNotFoundError:
+            storage.reloads = 0  # Nothing was read, so the indexes need no rebuild.
+        return storage
+
+    def open_shards(self, names):
+        """
+        Loads several shards in parallel.
+
+        Args:
+            names (list): The names of the shards, not loaded yet.
+        """
+        if len(names) == 1:
+            self.shards[names[0]] = self.open_shard(names[0])
+            return
+        from concurrent.futures import ThreadPoolExecutor  # Imported on first use, to keep startup fast.
+        with ThreadPoolExecutor(self.workers) as pool:
+            for name, storage in zip(names, pool.map(self.open_shard, names)):
+                self.shards[name] = storage
+
+    def shard(self, key):
+        """
+        Returns the storage of the shard a contact belongs to, loading it if needed.
+
+        Args:
+            key (str): Normalized phone number.
+
+        Returns:
+            JsonLinesStorage: The storage of the shard.
+        """
+        name = self.shard_name(key)
+        storage = self.shards.get(name)
+        if storage is None:
+            storage = self.shards[name] = self.open_shard(name)
+        return storage
+
+    def load_all(self):
+        """
+        Loads the shards not loaded yet, and keeps loading new ones as they appear.
+
+        Returns:
+            list: The storages of every shard, in the order of their names.
+        """
+        if not self.all_loaded:
+            self.open_shards([name for name in self.shard_names() if name not in self.shards])
+            self.all_loaded = True
+        return [self.shards[name] for name in sorted(self.shards)]
+
+    def load(self):
+        """
+        Loads every shard, or none in lazy mode, migrating a file from older versions first.
+        """
+        self.close()
+        self.generation_base = self.generation + 1
+        self.shards = {}
+        self.all_loaded = False
+        self.indexed_reloads = None
+        os.makedirs(self.directory, exist_ok=True)
+        if self.legacy_path and os.path.exists(self.legacy_path) and not self.shard_names():
+            self.migrate()
+        self.directory_changed()
+        if not self.lazy:
+            self.load_all()
+
+    def migrate(self):
+        """
+        Splits the file of older versions into shards.
+        """
+        groups = {}
+        for data in read_json_contacts(self.legacy_path):
+            contact = contact_from_data(data)
+            key = normalize_phone_number(contact.phone_number)
+            groups.setdefault(self.shard_name(key), {}).setdefault(key, contact)
+        for contacts in groups.values():
+            self.shard(next(iter(contacts))).add_many(contacts)
+        self.flush()
+        os.replace(self.legacy_path, self.legacy_path + '.migrated')
+        logging.info(f"Contacts migrated from {self.legacy_path} to {self.directory}")
+
+    def refresh(self):
+        """
+        Catches up with the shards changed or created by another process, at the cost of a
+        stat of the directory when there are none.
+
+        Returns:
+            bool: True if a shard had changed or was created.
+        """
+        if not self.directory_changed():
+            return False
+        changed = False
+        for shard in list(self.shards.values()):
+            changed = shard.refresh() or changed
+        new_names = [name for name in self.shard_names() if name not in self.shards]
+        if new_names:
+            changed = True
+            self.generation_base += 1  # Results cached before the new shards were found are stale.
+            if self.all_loaded:
+                self.open_shards(new_names)
+                self.indexed_reloads = None
+        return changed
+
+    def save(self):
+        with self.writing():
+            for shard in self.shards.values():
+                shard.save()
+
+    def flush(self):
+        with self.writing():
+            for shard in self.shards.values():
+                shard.flush()
+
+    def close(self):
+        """
+        Writes pending changes and closes every shard.
+        """
+        for shard in self.shards.values():
+            shard.close()
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.load_all())
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.load_all())
+
+    def __contains__(self, key):
+        return key in self.shard(key)
+
+    def get(self, key):
+        return self.shard(key).get(key)
+
+    def ensure_indexes(self):
+        """
+        Loads every shard and builds the indexes, unless they are current. They are rebuilt
+        after a shard was reloaded, as its contacts were then replaced by new objects.
+
+        Returns:
+            list: The storages of every shard, in the order of their names.
+        """
+        shards = self.load_all()
+        reloads = sum(shard.reloads for shard in shards)
+        if reloads != self.indexed_reloads:
+            for index in self.indexes:
+                index.clear()
+                for contact in itertools.chain.from_iterable(shards):
+                    index.add(contact)
+            self.indexed_reloads = reloads
+        return shards
+
+    def indexes_current(self):
+        """
+        Checks whether the indexes are built and no shard was reloaded since, as a reload
+        replaces the contacts with objects the indexes have never seen. Stale indexes are
+        dropped, to be rebuilt by the next query.
+
+        Returns:
+            bool: True if changes can be applied to the indexes.
+        """
+        if self.indexed_reloads is not None and sum(shard.reloads for shard in self.shards.values()) != self.indexed_reloads:
+            self.indexed_reloads = None
+        return self.indexed_reloads is not None
+
+    def add(self, key, contact):
+        with self.writing():
+            self.shard(key).add(key, contact)
+        if self.indexes_current():
+            for index in self.indexes:
+                index.add(contact)
+
+    def add_many(self, contacts):
+        groups = {}
+        for key, contact in contacts.items():
+            groups.setdefault(self.shard_name(key), {})[key] = contact
+        with self.writing():
+            for group in groups.values():
+                self.shard(next(iter(group))).add_many(group)
+        if self.indexes_current():
+            for index in self.indexes:
+                for contact in contacts.values():
+                    index.add(contact)
+
+    def update(self, old_key, contact):
+        """
+        Stores a contact that was changed in place, moving it to another shard if its phone
+        number changed shard. The contact is added to its new shard before it is removed from
+        the old one, so a crash in between leaves a duplicate rather than losing it.
+
+        Args:
+            old_key (str): Normalized phone number of the contact before the change.
+            contact (Contact): The changed contact.
+        """
+        new_key = normalize_phone_number(contact.phone_number)
+        with self.writing():
+            old_shard, new_shard = self.shard(old_key), self.shard(new_key)
+            if new_shard is old_shard:
+                old_shard.update(old_key, contact)
+            else:
+                new_shard.add(new_key, contact)
+                old_shard.delete(old_key)
+        if self.indexes_current():
+            for index in self.indexes:
+                index.update(contact)
+
+    def delete(self, key):
+        with self.writing():
+            contact = self.shard(key).delete(key)
+        if contact and self.indexes_current():
+            for index in self.indexes:
+                index.remove(contact)
+        return contact
+
+    def search(self, term):
+        return self.matching(term, ('first_name', 'last_name'))
+
+    def find(self, term):
+        return self.matching(term, ('first_name', 'last_name', 'phone_number'))
+
+    def matching(self, term, fields):
+        """
+        Searches for contacts whose fields match a regex, ignoring case, see JsonStorage.search.
+
+        Args:
+            term (str): The regex to search for.
+            fields (tuple): The fields to match.
+
+        Returns:
+            list: A list of matching contacts.
+        """
+        shards = self.ensure_indexes()
+        if len(term) >= 3 and is_literal(term):
+            matches, checked = self.trigram_index.search(term, fields)
+            self.contacts_scanned += checked
+            return matches
+        self.contacts_scanned += sum(len(shard) for shard in shards)
+        pattern = compile_pattern(term)
+        return [contact for contact in itertools.chain.from_iterable(shards)
+                if any(getattr(contact, field) and pattern.search(getattr(contact, field)) for field in fields)]
+
+    def complete(self, prefix, limit=10):
+        self.ensure_indexes()
+        return self.prefix_trie.complete(completion_key(prefix), limit)
+
+    def filter(self, predicates):
+        shards = self.ensure_indexes()
+        if not predicates:
+            return list(itertools.chain.from_iterable(shards))
+        matches, checked = execute(predicates, self)
+        self.contacts_scanned += checked
+        return matches
+
+    def list_contacts(self, sort_by=None, offset=0, limit=None):
+        """
+        Lists a page of contacts, optionally sorted by a given field, see JsonStorage.
+        Unsorted listings go shard by shard.
+        """
+        if sort_by in self.sorted_views:
+            self.ensure_indexes()
+            return self.sorted_views[sort_by].page(offset, limit)
+        end = None if limit is None else offset + limit
+        return list(itertools.islice(iter(self), offset, end))
+
+
+class SqliteStorage:
+    COLUMNS = ('first_name', 'last_name', 'phone_number', 'email', 'address', 'created_at', 'updated_at')
+
+    def __init__(self, path='contacts.db'):
+        """
+        Initializes a storage that keeps the contacts in an SQLite database instead of in memory.
+
+        Lookups, sorted listings and searches are answered by the database using indexes on
+        the normalized phone number and on the lowercased first and last names, so neither
+        opening the phone book nor querying it loads every contact.
+
+        Args:
+            path (str, optional): Path of the database file. Defaults to 'contacts.db'.
+        """
+        self.path = path
+        self.connection = None
+        self.select = f'SELECT {", ".join(self.COLUMNS)} FROM contacts'
+        self.bytes_written = 0  # Not tracked, as SQLite writes pages on its own.
+        self.contacts_scanned = 0  # Not tracked, as SQLite scans rows on its own.
+        self.generation = 0  # Bumped by every change, see JsonStorage.
+        self.data_version = None  # Changes when another connection commits.
+
+    def load(self):
+        """
+        Opens the database, creating the contacts table and its indexes if needed.
+        """
+        self.connection = sqlite3.connect(self.path)
+        self.connection.create_function('REGEXP', 2, self.regexp, deterministic=True)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS contacts (phone_key TEXT PRIMARY KEY, first_name TEXT, '
+                'last_name TEXT, phone_number TEXT, email TEXT, address TEXT, created_at INTEGER, updated_at INTEGER)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS contacts_first_name ON contacts (lower(first_name))')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS contacts_last_name ON contacts (lower(last_name))')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS contacts_created_at ON contacts (created_at)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS contacts_updated_at ON contacts (updated_at)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS contacts_email_domain ON contacts '
+                                    "(lower(substr(email, instr(email, '@') + 1)))")
+
+    @staticmethod
+    def regexp(pattern, value):
+        """
+        Implements the REGEXP operator of SQLite with a case-insensitive regex search.
+        """
+        return value is not None and compile_pattern(pattern).search(value) is not None
+
+    def save(self):
+        """
+        Does nothing, as every change is committed to the database as soon as it is made.
+        """
+
+    def flush(self):
+        """
+        Does nothing, as no change is ever left pending.
+        """
+
+    def refresh(self):
+        """
+        Bumps the generation if another connection changed the database since the last call.
+        Queries always read the database, which SQLite locks between processes.
+
+        Returns:
+            bool: True if the database had changed.
+        """
+        data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self.data_version:
+            return False
+        self.data_version = data_version
+        self.generation += 1
+        return True
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def query(self, where='', parameters=()):
+        """
+        Yields the contacts selected by an SQL clause, one row at a time.
+
+        Args:
+            where (str, optional): WHERE and ORDER BY clauses appended to the query.
+            parameters (tuple, optional): Values of the query placeholders.
+
+        Yields:
+            Contact: One matching contact.
+        """
+        for row in self.connection.execute(f'{self.select} {where}', parameters):
+            yield Contact(*row)
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM contacts').fetchone()[0]
+
+    def __iter__(self):
+        return self.query('ORDER BY rowid')
+
+    def __contains__(self, key):
+        return self.connection.execute('SELECT 1 FROM contacts WHERE phone_key = ?', (key,)).fetchone() is not None
+
+    def get(self, key):
+        return next(self.query('WHERE phone_key = ?', (key,)), None)
+
+    def add(self, key, contact):
+        self.generation += 1
+        with self.connection:
+            self.connection.execute('INSERT INTO contacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self.row(key, contact))
+
+    def add_many(self, contacts):
+        self.generation += 1
+        with self.connection:
+            self.connection.executemany('INSERT INTO contacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                        (self.row(key, contact) for key, contact in contacts.items()))
+
+    def update(self, old_key, contact):
+        assignments = ', '.join(f'{column} = ?' for column in ('phone_key',) + self.COLUMNS)
+        self.generation += 1
+        with self.connection:
+            self.connection.execute(f'UPDATE contacts SET {assignments} WHERE phone_key = ?',
+                                    self.row(normalize_phone_number(contact.phone_number), contact) + (old_key,))
+
+    def delete(self, key):
+        contact = self.get(key)
+        if contact:
+            self.generation += 1
+            with self.connection:
+                self.connection.execute('DELETE FROM contacts WHERE phone_key = ?', (key,))
+        return contact
+
+    def row(self, key, contact):
+        """
+        Returns the values of a contact in the column order of the contacts table.
+        """
+        return (key,) + tuple(getattr(contact, column) for column in self.COLUMNS)
+
+    def search(self, term):
+        return list(self.query(self.matching(term, ('first_name', 'last_name')) + ' ORDER BY rowid', self.parameters(term, 2)))
+
+    def find(self, term):
+        return list(self.query(self.matching(term, ('first_name', 'last_name', 'phone_number')) + ' ORDER BY rowid',
+                               self.parameters(term, 3)))
+
+    def matching(self, term, columns):
+        """
+        Returns a WHERE clause matching a search term against several columns.
+
+        Plain terms use a LIKE substring match; terms with regex syntax use REGEXP.
+        """
+        if is_literal(term):
+            return 'WHERE ' + ' OR '.join(f"lower({column}) LIKE ? ESCAPE '\\'" for column in columns)
+        return 'WHERE ' + ' OR '.join(f'{column} REGEXP ?' for column in columns)
+
+    def parameters(self, term, count):
+        """
+        Returns the placeholder values used by the clause built by matching.
+        """
+        if is_literal(term):
+            escaped = term.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            return (f'%{escaped}%',) * count
+        return (term,) * count
+
+    def complete(self, prefix, limit=10):
+        prefix = completion_key(prefix)
+        # Every word starting with the prefix sorts between the prefix and the prefix followed by
+        # the largest character, so each query is a range scan over an index.
+        upper_bound = prefix + '\U0010ffff'
+        completions = set()
+        for expression in ('lower(first_name)', 'lower(last_name)', 'phone_key'):
+            completions.update(row[0] for row in self.connection.execute(
+                f"SELECT DISTINCT {expression} FROM contacts WHERE {expression} >= ? AND {expression} < ? "
+                f"AND {expression} != '' ORDER BY {expression} LIMIT ?", (prefix, upper_bound, limit)))
+        return sorted(completions)[:limit]
+
+    def filter(self, predicates):
+        """
+        Finds the contacts matching every predicate of a query. The clauses of the predicates
+        let SQLite pick an index; the predicates then check the rows it returns.
+        """
+        clauses, parameters = [], []
+        for predicate in predicates:
+            predicate_clauses, predicate_parameters = predicate.sql()
+            clauses += predicate_clauses
+            parameters += predicate_parameters
+        where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return [contact for contact in self.query(where + ' ORDER BY rowid', parameters)
+                if all(predicate.matches(contact) for predicate in predicates)]
+
+    def list_contacts(self, sort_by=None, offset=0, limit=None):
+        if sort_by in SORT_FIELDS:
+            # Keep contacts with equal values in insertion order.
+            order = {'first_name': 'lower(first_name)', 'last_name': 'lower(last_name)'}.get(sort_by, sort_by) + ', rowid'
+        else:
+            order = 'rowid'
+        return list(self.query(f'ORDER BY {order} LIMIT ? OFFSET ?', (-1 if limit is None else limit, offset)))
+
+
+def parse_contact_line(line):
+    """
+    Parses one line of a line-delimited contacts file.
+
+    Args:
+        line (bytes or str): The JSON object of a contact, with its normalized phone number under 'key'.
+
+    Returns:
+        tuple: The normalized phone number and the Contact.
+    """
+    data = json.loads(line)
+    key = data.pop('key')
+    return key, contact_from_data(data)
+
+
+def read_contact_lines(path):
+    """
+    Yields the contacts of a line-delimited contacts file one at a time.
+
+    Args:
+        path (str): Path of the file.
+
+    Yields:
+        tuple: The normalized phone number and the Contact of each line.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    with open(path, 'rb') as file:
+        for line in file:
+            if line.strip():
+                yield parse_contact_line(line)
+
+
+def write_snapshot(path, contacts_data):
+    """
+    Atomically writes a list of contact dictionaries as a JSON array.
+
+    Args:
+        path (str): Path of the JSON file.
+        contacts_data (list): A list of dictionaries, one per contact.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(contacts_data, file, default=str)
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+    os.replace(temp_path, path)
+    return size
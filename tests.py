@@ -1,14 +1,44 @@
 import unittest
+import asyncio
+import bench
+import cli
 from phonebook import PhoneBook, Contact
+from audit import AuditLog
+from loadtest import request
+from server import PhoneBookServer
+from duplicates import soundex
+from metrics import Metrics
+from query import Between
+from snapshot import export_json, import_json
+from storage import BinaryStorage, JournalStorage, JsonLinesStorage, JsonStorage, ShardedStorage, SqliteStorage
 from utils import import_contacts_from_csv
+from validation import normalize_many, normalize_phone_number, validate_many
+import contextlib
 import io
+import multiprocessing
 import csv
+import json
+import logging
 import os
+import tempfile
+import threading
+import time
+
+def add_numbered_contacts(process):
+    """Adds ten contacts, one save at a time, from a worker process of test_shared_file_between_processes."""
+    phonebook = PhoneBook()
+    for number in range(10):
+        phonebook.add_contact(Contact("Worker", str(process), f"(700) 000-{process:02d}{number:02d}"))
+
 
 class TestPhoneBook(unittest.TestCase):
 
     def setUp(self):
         """Set up a phonebook and some sample contacts for testing."""
+        # Run each test in its own directory so the real contacts.json is never touched.
+        self.original_dir = os.getcwd()
+        self.test_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.test_dir.name)
         self.phonebook = PhoneBook()
         self.contact1 = Contact("John", "Doe", "(123) 456-7890", "john@example.com", "123 Maple St")
         self.contact2 = Contact("Jane", "Smith", "(555) 555-5555", "jane@example.com", "456 Oak St")
@@ -17,8 +47,8 @@ class TestPhoneBook(unittest.TestCase):
 
     def tearDown(self):
         """Clean up after tests."""
-        # If there is any file cleanup needed, it would go here.
-        pass
+        os.chdir(self.original_dir)
+        self.test_dir.cleanup()
 
     def test_add_contact(self):
         """Test adding a new contact."""
@@ -36,8 +66,8 @@ class TestPhoneBook(unittest.TestCase):
         self.phonebook.add_contact(contact5)  
         self.phonebook.add_contact(contact6) # Should be rejected as duplicate
         
-        # Verify that there are only 3 contacts (not 4) as the fourth is a duplicate
-        self.assertEqual(len(self.phonebook.contacts), 3, "Duplicate contact should not be added")
+        # Verify that only the 2 contacts from setUp remain, as all three share their phone numbers
+        self.assertEqual(len(self.phonebook.contacts), 2, "Duplicate contact should not be added")
 
     def test_search_contact(self):
         """Test searching for a contact by name."""
@@ -45,6 +75,34 @@ class TestPhoneBook(unittest.TestCase):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0].first_name, "Jane")
 
+    def test_search_uses_trigram_index(self):
+        """Test substring searches answered by the trigram index after changes."""
+        self.phonebook.add_contact(Contact("Bob", "Johnson", "(987) 654-3210"))
+        self.assertEqual([c.first_name for c in self.phonebook.search("john")], ["John", "Bob"])
+        self.phonebook.update_contact("(123) 456-7890", first_name="Jack")
+        self.assertEqual([c.first_name for c in self.phonebook.search("OHN")], ["Bob"])
+        self.assertEqual([c.first_name for c in self.phonebook.search("ja")], ["Jack", "Jane"])  # Too short for trigrams
+        self.assertEqual([c.first_name for c in self.phonebook.find_contact("654-3")], ["Bob"])
+        self.phonebook.delete_contact("(987) 654-3210")
+        self.assertEqual(self.phonebook.find_contact("654-3"), [])
+
+    def test_complete(self):
+        """Test autocompletion of names and phone numbers."""
+        self.phonebook.add_contact(Contact("Bob", "Johnson", "(123) 999-0000"))
+        self.assertEqual(self.phonebook.complete("jo"), ["john", "johnson"])
+        self.assertEqual(self.phonebook.complete("jo", limit=1), ["john"])
+        self.assertEqual(self.phonebook.complete("(123)"), ["1234567890", "1239990000"])
+        self.phonebook.delete_contact("(123) 999-0000")
+        self.phonebook.update_contact("(123) 456-7890", first_name="Jack")
+        self.assertEqual(self.phonebook.complete("j"), ["jack", "jane"])
+
+        phonebook = PhoneBook(SqliteStorage())
+        phonebook.add_contact(Contact("John", "Doe", "(123) 456-7890"))
+        phonebook.add_contact(Contact("Bob", "Johnson", "(123) 999-0000"))
+        self.assertEqual(phonebook.complete("JO"), ["john", "johnson"])
+        self.assertEqual(phonebook.complete("123", limit=1), ["1234567890"])
+        phonebook.close()
+
     def test_delete_contact(self):
         """Test deleting a contact by phone number."""
         self.phonebook.delete_contact(self.contact1.phone_number)
@@ -64,11 +122,540 @@ class TestPhoneBook(unittest.TestCase):
         self.assertEqual(updated_contact.first_name, "Johnny")
         self.assertEqual(updated_contact.email, "johnny@example.com")
 
+    def test_duplicate_phone_number_in_other_format(self):
+        """Test that phone numbers differing only in formatting are treated as duplicates."""
+        self.phonebook.add_contact(Contact("Johnny", "Doe", "123-456-7890"))
+        self.assertEqual(len(self.phonebook.contacts), 2)
+        self.assertIs(self.phonebook.find_contact_by_phone_number("123.456.7890"), self.contact1)
+
+    def test_update_contact_reindexes_phone_number(self):
+        """Test that the phone index follows a changed phone number."""
+        self.phonebook.update_contact(self.contact1.phone_number, new_phone_number="(321) 654-0987")
+        self.assertIsNone(self.phonebook.find_contact_by_phone_number("(123) 456-7890"))
+        self.phonebook.add_contact(Contact("Bob", "Brown", "(123) 456-7890"))
+        self.assertEqual(len(self.phonebook.contacts), 3)
+
+        # Renumbering onto another contact's number is rejected.
+        self.phonebook.update_contact("(321) 654-0987", new_phone_number="(555) 555-5555")
+        self.assertEqual(self.phonebook.find_contact_by_phone_number("(555) 555-5555"), self.contact2)
+
+    def test_bulk_import(self):
+        """Test importing a CSV file with valid, duplicate, invalid and incomplete rows."""
+        with open("import.csv", "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["first_name", "last_name", "phone_number", "email", "address"])
+            writer.writerow(["Bob", "Brown", "(987) 654-3210", "bob@example.com", "789 Pine St"])
+            writer.writerow(["Rob", "Brown", "(987) 654-3210", "", ""])  # Duplicate within the file
+            writer.writerow(["Jane", "Smith", "(555) 555-5555", "", ""])  # Duplicate of an existing contact
+            writer.writerow(["Amy", "Green", "12345", "", ""])  # Invalid phone number
+            writer.writerow(["Tim", "White", "", "", ""])  # Missing phone number
+
+        report = self.phonebook.bulk_import("import.csv")
+        self.assertEqual((report.added, report.skipped_duplicate, report.skipped_invalid, report.missing_phone), (1, 2, 1, 1))
+        self.assertEqual(len(PhoneBook().contacts), 3, "Imported contacts should be saved")
+
+    def test_parallel_import(self):
+        """Test importing several CSV files, split into byte ranges, in worker processes."""
+        for name, rows in (("first.csv", [["Bob", "Brown", f"(987) 654-32{n:02d}", "", ""] for n in range(50)]
+                                         + [["Jane", "Smith", "(555) 555-5555", "", ""]]),
+                           ("second.csv", [["Rob", "Brown", "(987) 654-3200", "", ""],
+                                           ["Amy", "Green", "12345", "", ""]])):
+            with open(name, "w", newline="") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(["first_name", "last_name", "phone_number", "email", "address"])
+                writer.writerows(rows)
+
+        reports = self.phonebook.parallel_import(["first.csv", "second.csv", "missing.csv"], processes=2, chunk_bytes=200)
+        self.assertEqual((reports["first.csv"].added, reports["first.csv"].skipped_duplicate), (50, 1))
+        self.assertEqual((reports["second.csv"].skipped_duplicate, reports["second.csv"].skipped_invalid), (1, 1))
+        self.assertEqual(reports["second.csv"].errors, ["invalid phone number '12345'"])
+        self.assertEqual(len(reports["missing.csv"].errors), 1)
+        self.assertEqual(len(PhoneBook().contacts), 52, "Imported contacts should be saved")
+
+        os.remove("contacts.jsonl")
+        phonebook = PhoneBook()
+        reports = phonebook.parallel_import(["first.csv", "second.csv"], processes=1, conflict="last")
+        self.assertEqual((reports["first.csv"].skipped_duplicate, reports["second.csv"].added), (1, 1))
+        self.assertEqual(phonebook.find_contact_by_phone_number("(987) 654-3200").first_name, "Rob")
+
+    def test_journal_storage_replays_changes(self):
+        """Test that changes appended to the journal are replayed over the snapshot on load."""
+        phonebook = PhoneBook(JournalStorage())
+        phonebook.add_contact(self.contact1)
+        phonebook.add_contact(self.contact2)
+        phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210"))
+        phonebook.update_contact("(123) 456-7890", new_phone_number="(321) 654-0987", first_name="Johnny")
+        phonebook.delete_contact("(555) 555-5555")
+        phonebook.add_contact(Contact("Amy", "Green", "(222) 333-4444"))
+        phonebook.update_contact("(987) 654-3210", email="bob@example.com")  # Keeps its position
+        phonebook.close()
+
+        reloaded = PhoneBook(JournalStorage())
+        self.assertEqual([c.phone_number for c in reloaded.contacts], ["(987) 654-3210", "(321) 654-0987", "(222) 333-4444"])
+        self.assertEqual(reloaded.find_contact_by_phone_number("(321) 654-0987").first_name, "Johnny")
+        reloaded.close()
+
+    def test_journal_storage_compaction(self):
+        """Test that compaction writes a snapshot and truncates the journal."""
+        phonebook = PhoneBook(JournalStorage(compact_every=2, fsync=False))
+        phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210"))
+        phonebook.add_contact(Contact("Amy", "Green", "(222) 333-4444"))
+        phonebook.close()
+
+        self.assertFalse(os.path.exists("contacts.json.journal"))
+        self.assertEqual(len(PhoneBook(JsonStorage()).contacts), 2, "The snapshot should hold every contact")
+
+        storage = JournalStorage("compacted.json", compact_every=2, fsync=False)
+        phonebook = PhoneBook(storage)
+        for number in range(5):
+            phonebook.add_contact(Contact("Worker", str(number), f"(700) 000-00{number:02d}"))
+        storage.wait_for_compaction()
+        reloads = storage.reloads
+        self.assertEqual(len(phonebook.search("Worker")), 5)
+        self.assertFalse(storage.refresh(), "The process's own compaction is not a change made elsewhere")
+        self.assertEqual(storage.reloads, reloads)
+        phonebook.close()
+        self.assertEqual(len(PhoneBook(JournalStorage("compacted.json")).contacts), 5)
+
+    def test_lazy_json_lines_storage(self):
+        """Test loading contacts lazily and migrating an old contacts.json file."""
+        os.remove("contacts.jsonl")
+        with open("contacts.json", "w") as json_file:
+            json.dump([self.contact1.to_dict(), self.contact2.to_dict()], json_file)
+
+        phonebook = PhoneBook(JsonLinesStorage(lazy=True))
+        self.assertTrue(os.path.exists("contacts.json.migrated"))
+        self.assertTrue(all(isinstance(value, int) for value in phonebook.storage.phone_index.values()))
+        self.assertEqual(phonebook.find_contact_by_phone_number("(555) 555-5555").first_name, "Jane")
+
+        # Saving copies the contacts that were never parsed.
+        phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210"))
+        self.assertEqual([c.first_name for c in phonebook.search("bro")], ["Bob"])
+        phonebook.close()
+        self.assertEqual([c.first_name for c in PhoneBook().contacts], ["John", "Jane", "Bob"])
+
+    def test_lazy_storage_reloaded_before_search(self):
+        """Test that lazy storages still build their indexes after reloading twice before the first search."""
+        self.phonebook.close()
+        import_json("contacts.jsonl", "contacts.bin")
+        for storage in (JsonLinesStorage(lazy=True, write_delay=2.0), BinaryStorage()):
+            phonebook = PhoneBook(storage)
+            other = PhoneBook(type(storage)())
+            other.add_contact(Contact("Dan", "Doe", "(987) 654-3210"))
+            other.close()
+            self.assertTrue(storage.refresh())
+            self.assertEqual([c.first_name for c in phonebook.search("Doe")], ["John", "Dan"])
+            self.assertEqual([c.first_name for c in phonebook.list_contacts("last_name")], ["John", "Dan", "Jane"])
+            self.assertEqual(len(phonebook.storage.complete("d")), 2)
+            phonebook.close()
+
+    def test_binary_storage(self):
+        """Test the binary snapshot: timestamps kept, contacts decoded on access, and JSON converters."""
+        self.phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210", created_at=1000000000, updated_at=1000000001))
+        self.phonebook.close()
+        self.assertEqual(import_json("contacts.jsonl", "contacts.bin"), 3)
+
+        phonebook = PhoneBook(BinaryStorage())
+        self.assertEqual(len(phonebook.storage.phone_index.decoded), 0, "Loading should not decode contacts")
+        bob = phonebook.find_contact_by_phone_number("987.654.3210")
+        self.assertEqual((bob.first_name, bob.created_at, bob.updated_at), ("Bob", 1000000000, 1000000001))
+        phonebook.delete_contact("(123) 456-7890")
+        phonebook.add_contact(Contact("John", "Doe", "(123) 456-7890"))
+        phonebook.update_contact("(555) 555-5555", new_phone_number="(555) 555-0000")
+        self.assertEqual([c.first_name for c in phonebook.search("bro")], ["Bob"])
+        phonebook.close()
+
+        phonebook = PhoneBook(BinaryStorage())
+        self.assertEqual([c.first_name for c in phonebook.contacts], ["Bob", "John", "Jane"])
+        self.assertIsNone(phonebook.find_contact_by_phone_number("(555) 555-5555"))
+        phonebook.close()
+        self.assertEqual(export_json("contacts.bin", "contacts.json"), 3)
+        with open("contacts.json") as json_file:
+            self.assertEqual(json.load(json_file)[0]["created_at"], 1000000000)
+
+    def test_binary_storage_migrates_default_store(self):
+        """Test that the binary snapshot is converted from the file of the default storage."""
+        self.phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210", created_at=1000000000))
+        self.phonebook.close()
+
+        phonebook = PhoneBook(BinaryStorage())
+        self.assertEqual([c.first_name for c in phonebook.contacts], ["John", "Jane", "Bob"])
+        self.assertEqual(phonebook.find_contact_by_phone_number("(987) 654-3210").created_at, 1000000000)
+        phonebook.close()
+        self.assertTrue(os.path.exists("contacts.jsonl.migrated"))
+
+    def test_sharded_storage(self):
+        """Test that contacts are split into area code shards, each rewritten alone and loaded when needed."""
+        self.phonebook.close()
+        phonebook = PhoneBook(ShardedStorage())
+        self.assertTrue(os.path.exists("contacts.jsonl.migrated"))
+        self.assertEqual(sorted(os.listdir("contacts")), [".lock", "123.jsonl", "123.jsonl.lock", "555.jsonl", "555.jsonl.lock"])
+        phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210"))
+        untouched = os.stat("contacts/123.jsonl").st_ino
+        phonebook.update_contact("(555) 555-5555", new_phone_number="(987) 111-2222")  # Moves to another shard
+        self.assertEqual(os.stat("contacts/123.jsonl").st_ino, untouched, "Only the changed shards should be rewritten")
+        self.assertEqual([c.first_name for c in phonebook.list_contacts(sort_by="first_name")], ["Bob", "Jane", "John"])
+        phonebook.close()
+
+        phonebook = PhoneBook(ShardedStorage(lazy=True))
+        self.assertEqual(phonebook.find_contact_by_phone_number("(987) 111-2222").first_name, "Jane")
+        self.assertEqual(list(phonebook.storage.shards), ["987"])
+        self.assertEqual([c.first_name for c in phonebook.search("o")], ["John", "Bob"])
+        self.assertEqual(len(phonebook.contacts), 3)
+        phonebook.close()
+
+        phonebook = PhoneBook(ShardedStorage("hashed", shard_count=2, legacy_path=None))
+        for number in range(6):
+            phonebook.add_contact(Contact("Amy", "Green", f"(222) 333-444{number}"))
+        phonebook.close()
+        self.assertEqual(len(PhoneBook(ShardedStorage("hashed", shard_count=2)).contacts), 6)
+        self.assertLessEqual(len([name for name in os.listdir("hashed") if name.endswith(".jsonl")]), 2)
+
+    def test_sharded_storage_own_writes(self):
+        """Test that the sharded storage neither checks every shard nor rebuilds its indexes after its own writes."""
+        storage = ShardedStorage()
+        phonebook = PhoneBook(storage)
+        self.assertEqual(len(phonebook.search("Doe")), 1)
+        reloads = storage.indexed_reloads
+        phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210"))  # Opens a new area code shard
+        self.assertFalse(storage.refresh(), "The process's own write is not a change made elsewhere")
+        self.assertEqual([c.first_name for c in phonebook.search("Brown")], ["Bob"])
+        self.assertEqual(storage.indexed_reloads, reloads, "The indexes should be updated, not rebuilt")
+
+        other = PhoneBook(ShardedStorage())
+        other.add_contact(Contact("Amy", "Green", "(222) 333-4444"))
+        other.close()
+        self.assertTrue(storage.refresh())
+        self.assertEqual(phonebook.find_contact_by_phone_number("(222) 333-4444").first_name, "Amy")
+        phonebook.close()
+
+    def test_sharded_storage_changed_by_another_process(self):
+        """Test that updates and deletes after a search survive another process rewriting the shard."""
+        phonebook = PhoneBook(ShardedStorage())
+        self.assertEqual(len(phonebook.search("Doe")), 1)
+        for number, change in enumerate((lambda: phonebook.update_contact("(123) 456-7890", first_name="Johnny"),
+                                         lambda: phonebook.delete_contact("(123) 456-7890"))):
+            other = PhoneBook(ShardedStorage())
+            other.add_contact(Contact("Cy", "Young", f"(123) 000-000{number}"))  # Same shard as John
+            other.close()
+            change()
+        self.assertEqual([c.first_name for c in phonebook.search("Young")], ["Cy", "Cy"])
+        self.assertEqual(phonebook.search("Doe"), [])
+        phonebook.close()
+        with open(phonebook.audit_log.segment_path(1)) as audit_file:
+            self.assertEqual(json.loads(audit_file.readlines()[-1])["op"], "delete")
+        self.assertEqual(len(PhoneBook(ShardedStorage()).contacts), 3)
+
+    def test_write_behind(self):
+        """Test that changes are written by the background writer, coalesced and on flush."""
+        phonebook = PhoneBook(JsonLinesStorage(write_delay=60, write_batch=3))
+        phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210"))
+        phonebook.update_contact("(987) 654-3210", first_name="Robert")
+        self.assertEqual(len(PhoneBook(JsonLinesStorage()).contacts), 2, "Changes should wait for the writer")
+
+        phonebook.flush()
+        self.assertEqual(PhoneBook(JsonLinesStorage()).find_contact_by_phone_number("(987) 654-3210").first_name, "Robert")
+
+        # Reaching the batch size wakes the writer without waiting for the delay.
+        for number in range(3):
+            phonebook.add_contact(Contact("Amy", "Green", f"(222) 333-444{number}"))
+        deadline = time.monotonic() + 5
+        while phonebook.storage.writer.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with phonebook.storage.lock:
+            self.assertEqual(len(PhoneBook(JsonLinesStorage()).contacts), 6)
+
+        phonebook.delete_contact("(222) 333-4440")
+        phonebook.close()
+        self.assertEqual(len(PhoneBook(JsonLinesStorage()).contacts), 5, "Closing should write pending changes")
+
+    def test_refresh_during_own_save(self):
+        """Test that a read waiting for the process's own save does not reload the file afterwards."""
+        storage = self.phonebook.storage
+        reloads = storage.reloads
+        results = []
+        reader = threading.Thread(target=lambda: results.append(storage.refresh()))
+        with storage.lock:
+            storage.write()  # The file is replaced, but the signature is not recorded yet.
+            reader.start()
+            time.sleep(0.05)  # The reader sees the new file and waits for the lock.
+            storage.signature = storage.file_signature()
+        reader.join()
+        self.assertEqual((results, storage.reloads), ([False], reloads))
+
+    def test_shared_file_between_processes(self):
+        """Test that phone books sharing a file see and keep each other's changes."""
+        other = PhoneBook()
+        self.assertFalse(other.storage.refresh(), "Nothing changed since the file was read")
+        self.phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210"))
+        other.add_contact(Contact("Amy", "Green", "(222) 333-4444"))  # Merged into the file changed by the first.
+        self.assertEqual([c.first_name for c in self.phonebook.search("Green")], ["Amy"])
+        self.phonebook.delete_contact("(123) 456-7890")
+        self.assertIsNone(other.find_contact_by_phone_number("(123) 456-7890"))
+
+        with multiprocessing.Pool(4) as pool:
+            pool.map(add_numbered_contacts, range(4))
+        self.assertEqual(len(self.phonebook.contacts), 3 + 4 * 10, "No change should be lost")
+
+    def test_sqlite_storage(self):
+        """Test the phone book operations on top of an SQLite database."""
+        phonebook = PhoneBook(SqliteStorage())
+        phonebook.add_contact(Contact("john", "Doe", "(123) 456-7890"))
+        phonebook.add_contact(Contact("Alice", "Zimmer", "(222) 333-4444"))
+        phonebook.add_contact(Contact("Al", "Smith", "222.333.4444"))  # Duplicate in another format
+        phonebook.update_contact("(222) 333-4444", new_phone_number="(321) 654-0987", last_name="Adams")
+        phonebook.close()
+
+        phonebook = PhoneBook(SqliteStorage())
+        self.assertEqual(len(phonebook.contacts), 2)
+        self.assertEqual(phonebook.find_contact_by_phone_number("3216540987").last_name, "Adams")
+        self.assertEqual([c.first_name for c in phonebook.list_contacts(sort_by="first_name")], ["Alice", "john"])
+        self.assertEqual([c.first_name for c in phonebook.search("JOH")], ["john"])
+        self.assertEqual([c.first_name for c in phonebook.search("^a.*s$")], ["Alice"])
+        self.assertEqual([c.first_name for c in phonebook.find_contact("654")], ["Alice"])
+        phonebook.delete_contact("(123) 456-7890")
+        self.assertIsNone(phonebook.find_contact_by_phone_number("(123) 456-7890"))
+        phonebook.close()
+
+    def test_contact_round_trip(self):
+        """Test that a contact survives conversion to a dictionary, with integer timestamps."""
+        contact = Contact("Bob", "Brown", "(987) 654-3210", created_at="2024-09-15 14:00:15", updated_at=1726423215)
+        self.assertIsInstance(contact.created_at, int)
+        copy = Contact(**contact.to_dict())
+        self.assertEqual(copy.to_dict(), contact.to_dict())
+        self.assertEqual(str(copy), "Bob Brown, (987) 654-3210, , ")
+        self.assertFalse(hasattr(contact, "__dict__"))
+
+        for storage in (JsonStorage("round.json"), JsonLinesStorage("round.jsonl"), JournalStorage("journal.json")):
+            phonebook = PhoneBook(storage)
+            phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210", created_at=1000000000, updated_at=1000000001))
+            phonebook.close()
+            phonebook = PhoneBook(type(storage)(storage.path))
+            reloaded = phonebook.find_contact_by_phone_number("(987) 654-3210")
+            self.assertEqual((reloaded.created_at, reloaded.updated_at), (1000000000, 1000000001))
+            phonebook.close()
+
+    def test_list_contacts_pages(self):
+        """Test sorted and paginated listings kept up to date on changes."""
+        self.phonebook.add_contact(Contact("adam", "Brown", "(987) 654-3210"))
+        self.assertEqual([c.first_name for c in self.phonebook.list_contacts(sort_by="first_name")], ["adam", "Jane", "John"])
+        self.assertEqual([c.first_name for c in self.phonebook.list_contacts(sort_by="last_name", offset=1, limit=1)], ["John"])
+        self.phonebook.update_contact("(987) 654-3210", first_name="Zoe")
+        self.assertEqual([c.first_name for c in self.phonebook.list_contacts(sort_by="first_name", limit=2)], ["Jane", "John"])
+        self.assertEqual([c.first_name for c in self.phonebook.list_contacts(offset=2)], ["Zoe"])
+        self.phonebook.delete_contact("(123) 456-7890")
+        self.assertEqual([c.first_name for c in self.phonebook.list_contacts(sort_by="created_at")], ["Jane", "Zoe"])
+
+        phonebook = PhoneBook(SqliteStorage())
+        for contact in self.phonebook.contacts:
+            phonebook.add_contact(contact)
+        self.assertEqual([c.first_name for c in phonebook.list_contacts(sort_by="first_name", offset=1, limit=5)], ["Zoe"])
+        phonebook.close()
+
+    def test_audit_contact(self):
+        """Test that the audit history follows a contact through changes and ignores namesakes."""
+        self.phonebook.update_contact("(123) 456-7890", new_phone_number="(321) 654-0987", email="johnny@example.com")
+        self.phonebook.add_contact(Contact("John", "Doe", "(987) 654-3210"))  # Same name, another contact
+        self.phonebook.close()
+
+        phonebook = PhoneBook()
+        history = phonebook.audit_contact(phonebook.find_contact_by_phone_number("(321) 654-0987"))
+        self.assertEqual([record["op"] for record in history], ["add", "update"])
+        self.assertEqual(history[1]["before"]["email"], "john@example.com")
+        self.assertEqual(history[1]["after"]["email"], "johnny@example.com")
+
+    def test_audit_log_rotation(self):
+        """Test that the audit log keeps a bounded number of segments."""
+        audit_log = AuditLog("rotated.jsonl", max_bytes=500, backup_count=2)
+        for number in range(10):
+            audit_log.record("update" if number else "add", "1234567890", after={"number": number})
+        audit_log.close()
+
+        audit_log = AuditLog("rotated.jsonl", max_bytes=500, backup_count=2)
+        audit_log.load()
+        self.assertEqual(len(audit_log.segments), 2)
+        self.assertEqual(len([name for name in os.listdir(".") if name.startswith("rotated.0")]), 2)
+        history = audit_log.history("1234567890")
+        self.assertEqual(history[-1]["after"], {"number": 9})
+        self.assertLess(len(history), 10)
+
+    def test_audit_log_shared_between_instances(self):
+        """Test that two phone books on one directory record and read each other's audit records."""
+        other = PhoneBook()
+        self.phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210"))
+        other.add_contact(Contact("Cy", "Young", "(222) 333-4444"))
+        self.phonebook.update_contact("(222) 333-4444", email="cy@example.com")
+        for phonebook in (self.phonebook, other):
+            history = phonebook.audit_contact(phonebook.find_contact_by_phone_number("(222) 333-4444"))
+            self.assertEqual([(record["op"], record["key"]) for record in history], [("add", "2223334444"), ("update", "2223334444")])
+        self.phonebook.close()
+        other.close()
+
+        phonebook = PhoneBook()
+        self.assertEqual(len(phonebook.audit_contact(Contact("Cy", "Young", "(222) 333-4444"))), 2)
+        self.assertEqual(phonebook.audit_contact(Contact("Bob", "Brown", "(987) 654-3210"))[0]["after"]["first_name"], "Bob")
+        phonebook.close()
+
+    def test_benchmark_runs_in_isolation(self):
+        """Test that the benchmark measures every operation without touching the working directory."""
+        results = bench.run_size(50, 5, "json", trace_memory=False)
+        self.assertIn("batch_import", results)
+        self.assertEqual(results["add_contact"]["calls"], 5)
+        self.assertFalse(os.path.exists("contacts.csv"))
+
+    def test_stats(self):
+        """Test the metrics collected on phone book operations."""
+        self.phonebook.search("Jane")
+        self.phonebook.search("^J")
+        stats = self.phonebook.stats()
+        self.assertEqual(stats["operations"]["add_contact"]["calls"], 2)
+        self.assertEqual(stats["operations"]["search"]["calls"], 2)
+        self.assertEqual(sum(stats["operations"]["search"]["histogram"].values()), 2)
+        self.assertGreater(stats["bytes_written"], 0)
+        self.assertEqual(stats["contacts_scanned"], 3, "One trigram candidate plus a scan of both contacts")
+
+        phonebook = PhoneBook(metrics=Metrics(enabled=False))
+        phonebook.search("Jane")
+        self.assertEqual(phonebook.stats()["operations"], {})
+
+    def test_find_and_merge_duplicates(self):
+        """Test suggesting near-duplicate contacts and merging them."""
+        self.phonebook.add_contact(Contact("Jon", "Doe", "(123) 456-7891", "jdoe@example.com", "1 Main St"))
+        self.phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210", "jdoe@mail.com"))
+
+        self.assertEqual(soundex("Jon"), soundex("John"))
+        candidates = self.phonebook.find_duplicates()
+        self.assertEqual([(contact.first_name, other.first_name) for _, contact, other in candidates], [("John", "Jon")])
+        self.assertEqual(self.phonebook.find_duplicates(max_block=1), [])
+
+        self.assertEqual(self.phonebook.merge_duplicates(candidates + candidates), 1)
+        self.assertIsNone(self.phonebook.find_contact_by_phone_number("(123) 456-7891"))
+        self.assertEqual(self.phonebook.find_contact_by_phone_number("(123) 456-7890").address, "123 Maple St", "Kept fields win")
+        self.assertEqual(len(PhoneBook().contacts), 3)
+
+    def test_server(self):
+        """Test the HTTP/JSON service over a shared phone book."""
+        async def exchange():
+            server = PhoneBookServer(PhoneBook(JsonLinesStorage(write_delay=60)), port=0)
+            await server.start()
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            responses = [
+                await request(reader, writer, "POST", "/contacts", {"first_name": "Bob", "last_name": "Brown",
+                                                                     "phone_number": "987-654-3210"}),
+                await request(reader, writer, "POST", "/contacts", {"phone_number": "(555) 555-5555"}),
+                await request(reader, writer, "PUT", "/contacts/9876543210", {"first_name": "Robert"}),
+                await request(reader, writer, "GET", "/search?q=rob"),
+                await request(reader, writer, "GET", "/contacts?limit=2&sort_by=first_name"),
+                await request(reader, writer, "DELETE", "/contacts/5555555555"),
+                await request(reader, writer, "GET", "/contacts/5555555555"),
+            ]
+            self.assertNotEqual(await server.write(threading.get_ident), threading.get_ident(), "Changes should run off the loop")
+            writer.close()
+            await server.close()
+            return responses
+
+        responses = asyncio.run(exchange())
+        self.assertEqual([status for status, _ in responses], [201, 409, 200, 200, 200, 204, 404])
+        self.assertEqual(responses[0][1]["phone_number"], "(987) 654-3210")
+        self.assertEqual([contact["first_name"] for contact in responses[3][1]], ["Robert"])
+        self.assertEqual([contact["first_name"] for contact in responses[4][1]["contacts"]], ["Jane", "John"])
+        self.assertEqual(len(PhoneBook().contacts), 2, "Closing the server should save the changes")
+
+    def test_search_cache(self):
+        """Test that repeated searches are cached until the phone book changes."""
+        self.assertEqual(self.phonebook.search("^j"), [self.contact1, self.contact2])
+        self.phonebook.search("^j").clear()  # Changing a result does not change the cache.
+        self.assertEqual(self.phonebook.search("^j"), [self.contact1, self.contact2])
+        self.assertEqual((self.phonebook.cache.hits, self.phonebook.cache.misses), (2, 1))
+
+        self.phonebook.add_contact(Contact("Jim", "Green", "(222) 333-4444"))
+        self.assertEqual(len(self.phonebook.search("^j")), 3)
+        PhoneBook().delete_contact("(222) 333-4444")  # Another phone book sharing the file.
+        self.assertEqual(len(self.phonebook.search("^j")), 2)
+        self.assertEqual(self.phonebook.stats()["cache"]["misses"], 3)
+
+        phonebook = PhoneBook(cache_size=0)
+        phonebook.search("Jane")
+        phonebook.search("Jane")
+        self.assertEqual((phonebook.cache.hits, len(phonebook.cache.entries)), (0, 0))
+        self.assertEqual(phonebook.stats()["cache"]["pattern_max_size"], 0)
+
+        phonebook = PhoneBook(cache_size=2)
+        for term in ("^a", "^b", "^c"):
+            phonebook.search(term)
+        self.assertEqual({key: phonebook.stats()["cache"][key] for key in ("pattern_size", "pattern_max_size")},
+                         {"pattern_size": 2, "pattern_max_size": 2})
+
+    def test_query(self):
+        """Test multi-field queries on email domain, address words and timestamp ranges, before and after reloading."""
+        self.phonebook.add_contact(Contact("Bob", "Brown", "(987) 654-3210", "bob@Example.com", "12 Oak Avenue",
+                                           created_at=1000000000, updated_at=1700000000))
+        self.phonebook.add_contact(Contact("Amy", "Green", "(222) 333-4444", "amy@mail.com", "7 Oak Avenue"))
+        sqlite_phonebook = PhoneBook(SqliteStorage())
+        for contact in self.phonebook.contacts:
+            sqlite_phonebook.add_contact(contact)
+
+        for phonebook in (self.phonebook, PhoneBook(), PhoneBook(JsonLinesStorage(lazy=True)), sqlite_phonebook):
+            self.assertEqual([c.first_name for c in phonebook.query(email_domain="@example.com")], ["John", "Jane", "Bob"])
+            self.assertEqual([c.first_name for c in phonebook.query(address="avenue OAK")], ["Bob", "Amy"])
+            self.assertEqual([c.first_name for c in phonebook.query(email_domain="example.com", address="oak avenue",
+                                                                     updated_after="2023-01-01 00:00:00")], ["Bob"])
+            self.assertEqual([c.first_name for c in phonebook.query(Between("created_at", high=1000000000))], ["Bob"])
+            self.assertEqual(phonebook.query(address="oak", created_before=999999999), [])
+        sqlite_phonebook.close()
+
+        self.phonebook.update_contact("(222) 333-4444", email="amy@example.com")
+        self.phonebook.update_contact("(987) 654-3210", address="1 Pine Lane")
+        self.assertEqual([c.first_name for c in self.phonebook.query(email_domain="example.com", address="oak avenue")], ["Amy"])
+        with self.assertRaises(ValueError):
+            self.phonebook.query(address=" - ")
+
+    def test_cli_and_export(self):
+        """Test the CLI subcommands and their exit codes, and streaming export to CSV and JSON lines."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(cli.main(["add", "Bob", "Brown", "987.654.3210", "--email", "bob@example.com"]), 0)
+            self.assertEqual(cli.main(["get", "+1 987 654 3210"]), 0)
+            self.assertEqual(cli.main(["get", "(000) 000-0000"]), 1)
+            self.assertEqual(cli.main(["export", "out.jsonl"]), 0)
+            self.assertEqual(cli.main(["delete", "(987) 654-3210"]), 0)
+            self.assertEqual(cli.main(["delete", "(987) 654-3210"]), 1)
+        self.assertIn("Bob Brown, (987) 654-3210, bob@example.com", output.getvalue())
+        with open("out.jsonl") as file:
+            self.assertEqual([json.loads(line)["key"] for line in file], ["1234567890", "5555555555", "9876543210"])
+
+        file = io.StringIO()
+        self.assertEqual(self.phonebook.export_contacts(file), 2)
+        rows = list(csv.DictReader(io.StringIO(file.getvalue())))
+        self.assertEqual([(row["first_name"], row["address"]) for row in rows], [("John", "123 Maple St"), ("Jane", "456 Oak St")])
+        file = io.StringIO()
+        self.phonebook.export_contacts(file, format="jsonl")
+        self.assertEqual(json.loads(file.getvalue().splitlines()[1])["email"], "jane@example.com")
+        with self.assertRaises(ValueError):
+            self.phonebook.export_contacts(io.StringIO(), format="xml")
+
+    def test_logging_configured_once(self):
+        """Test that further phone books reuse the log handler instead of opening logs.txt again."""
+        handlers = list(logging.getLogger().handlers)
+        PhoneBook().close()
+        self.assertEqual(logging.getLogger().handlers, handlers)
+
     def test_invalid_phone_number(self):
         """Test phone number validation."""
         self.assertFalse(self.phonebook.validate_phone_number("12345"), "Invalid phone number should fail validation")
         self.assertTrue(self.phonebook.validate_phone_number("(555) 555-5555"), "Valid phone number should pass validation")
 
+    def test_phone_number_notations(self):
+        """Test that the usual phone number notations are validated, canonicalized and formatted."""
+        numbers = ["(123) 456-7890", "123-456-7890", "123.456.7890", "1234567890", "+1 123 456 7890", "(12) 3456-7890"]
+        self.assertEqual(validate_many(numbers, "phone"), [True] * 5 + [False])
+        self.assertEqual(normalize_many(numbers)[:5], [("1234567890", "(123) 456-7890")] * 5)
+        self.assertIsNone(normalize_many(numbers)[5])
+        self.assertEqual(normalize_phone_number("+1 (123) 456-7890"), "1234567890")
+
+        self.phonebook.add_contact(Contact("Bob", "Brown", "987.654.3210"))
+        self.assertEqual(self.phonebook.find_contact_by_phone_number("+1 987 654 3210").phone_number, "(987) 654-3210")
+
     def test_invalid_email(self):
         """Test email validation."""
         self.assertFalse(self.phonebook.validate_email("invalid-email"), "Invalid email should fail validation")
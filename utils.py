@@ -1,52 +1,48 @@
-import tkinter as tk
-from tkinter import filedialog
 import os
-import csv
 
 def import_contacts_from_csv(phonebook):
     """
-    Opens a file dialog to select a CSV file and imports contacts from it.
+    Opens a file dialog to select one or more CSV files and imports contacts from them.
+
+    tkinter is only imported here, so the phone book starts without it and runs on
+    servers without a display.
 
     Args:
         phonebook (PhoneBook): The phone book object where contacts will be imported.
     """
+    root = None
     try:
+        import tkinter as tk
+        from tkinter import filedialog
+
         # Initialize Tkinter and hide the main window
-        # root = tk.Tk()
-        # root.withdraw()  # Hide the Tk window
+        root = tk.Tk()
+        root.withdraw()  # Hide the Tk window
 
         print("Opening file dialog...")  # Debug statement
-        # Open file dialog to select the CSV file.
-        file_path = filedialog.askopenfilename(
-            title="Select CSV File",
+        # Open file dialog to select the CSV files.
+        file_paths = filedialog.askopenfilenames(
+            title="Select CSV Files",
             filetypes=[("CSV Files", "*.csv"), ("All Files", "*.*")]
         )
 
-        if file_path and os.path.exists(file_path):
-            print(f"File selected: {file_path}")  # Debug statement
-            # Delay the import of Contact to avoid circular import issues
-            from phonebook import Contact  
-            
-            with open(file_path, 'r') as csv_file:
-                reader = csv.DictReader(csv_file)
-                for row in reader:
-                    # Create a Contact object from each row in the CSV file
-                    contact = Contact(
-                        first_name=row['first_name'],
-                        last_name=row['last_name'],
-                        phone_number=row['phone_number'],
-                        email=row.get('email', ''),    # Handle optional fields.
-                        address=row.get('address', '')  # Handle optional fields.
-                    )
-                    phonebook.add_contact(contact)
-            print(f"Contacts imported successfully from {file_path}.")
+        file_paths = [file_path for file_path in file_paths if os.path.exists(file_path)]
+        if file_paths:
+            print(f"Files selected: {', '.join(file_paths)}")  # Debug statement
+            # Parse and validate the files in parallel, then save all new contacts at once.
+            reports = phonebook.parallel_import(file_paths)
+            for file_path, report in reports.items():
+                print(f"Contacts imported from {file_path}: {report}")
+                for error in report.errors:
+                    red_print(f"  {error}")
         else:
             print("No file selected or the file doesn't exist.")
 
     except Exception as e:
         print(f"An error occurred: {e}")
-    # finally:
-    #     root.destroy()  # Ensure Tkinter is properly destroyed
+    finally:
+        if root is not None:
+            root.destroy()  # Ensure Tkinter is properly destroyed
 
 
 def green_print(text):
@@ -0,0 +1,122 @@
+import re
+
+
+# Compiled once; every helper below reuses them.
+NON_DIGITS = re.compile(r'\D')
+# North American numbers in the usual notations, e.g. (123) 456-7890, 123-456-7890,
+# 123.456.7890, 1234567890 or +1 123 456 7890.
+PHONE_NUMBER = re.compile(r'\s*(?:\+?1[\s.-]?)?(?:\((\d{3})\)\s?|(\d{3})[\s.-]?)(\d{3})[\s.-]?(\d{4})\s*')
+EMAIL = re.compile(r'[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w+')  # Basic email validation pattern.
+PATTERNS = {'phone': PHONE_NUMBER, 'email': EMAIL}
+
+
+def normalize_phone_number(phone_number):
+    """
+    Returns the canonical key for a phone number, used to index and deduplicate contacts.
+
+    Only the digits are kept, without the country code 1 of an 11-digit number, so
+    "(123) 456-7890", "123-456-7890" and "+1 123 456 7890" map to the same key.
+
+    Args:
+        phone_number (str): Phone number in any format.
+
+    Returns:
+        str: The digits of the phone number.
+    """
+    digits = NON_DIGITS.sub('', phone_number or '')
+    if len(digits) == 11 and digits[0] == '1':
+        return digits[1:]
+    return digits
+
+
+def parse_phone_number(phone_number):
+    """
+    Validates a phone number and returns its key and display format.
+
+    Args:
+        phone_number (str): Phone number in one of the accepted notations.
+
+    Returns:
+        tuple: The digits-only key and the (###) ###-#### display format, or None if the
+            phone number is not valid.
+    """
+    match = PHONE_NUMBER.fullmatch(phone_number)
+    if match is None:
+        return None
+    area = match[1] or match[2]
+    return area + match[3] + match[4], f'({area}) {match[3]}-{match[4]}'
+
+
+def format_phone_number(phone_number):
+    """
+    Returns the display format of a phone number, (###) ###-####.
+
+    Args:
+        phone_number (str): Phone number in any format.
+
+    Returns:
+        str: The formatted phone number, or phone_number unchanged if it is not valid.
+    """
+    parsed = parse_phone_number(phone_number)
+    return phone_number if parsed is None else parsed[1]
+
+
+def validate_phone_number(phone_number):
+    """
+    Validates the phone number format, accepting the usual notations such as (###) ###-####.
+
+    Args:
+        phone_number (str): Phone number to validate.
+
+    Returns:
+        bool: True if valid, False otherwise.
+    """
+    return PHONE_NUMBER.fullmatch(phone_number) is not None
+
+
+def validate_email(email):
+    """
+    Validates the email address format using a regex pattern.
+
+    Args:
+        email (str): Email address to validate.
+
+    Returns:
+        bool: True if valid, False otherwise.
+    """
+    return EMAIL.fullmatch(email) is not None
+
+
+def validate_many(values, kind):
+    """
+    Validates a column of values with a single compiled pattern.
+
+    Args:
+        values (iterable): The values to validate.
+        kind (str): 'phone' or 'email'.
+
+    Returns:
+        list: One bool per value.
+    """
+    fullmatch = PATTERNS[kind].fullmatch
+    return [match is not None for match in map(fullmatch, values)]
+
+
+def normalize_many(phone_numbers):
+    """
+    Validates and canonicalizes a column of phone numbers, with one regex call per value.
+
+    Args:
+        phone_numbers (iterable): Phone numbers in any of the accepted notations.
+
+    Returns:
+        list: The (key, display format) pair of each phone number, or None for an invalid one.
+    """
+    results = []
+    for match in map(PHONE_NUMBER.fullmatch, phone_numbers):
+        if match is None:
+            results.append(None)
+        else:
+            area = match[1] or match[2]
+            results.append((area + match[3] + match[4], f'({area}) {match[3]}-{match[4]}'))
+    return results
@@ -0,0 +1,99 @@
+import atexit
+import logging
+import threading
+import time
+
+
+class BackgroundWriter:
+    def __init__(self, storage, delay=1.0, batch_size=100):
+        """
+        Initializes a write-behind writer that saves a storage from a background thread.
+
+        Changes only mark the storage dirty. The thread then saves it once, atomically,
+        when delay seconds have passed since the first unsaved change or batch_size changes
+        have accumulated, so a burst of changes costs a single rewrite. Pending changes are
+        written by flush(), by close() and when the interpreter exits.
+
+        The thread saves while holding storage.lock, which the storage also holds while
+        changing its contacts.
+
+        Args:
+            storage (JsonStorage): The storage to save.
+            delay (float, optional): Seconds a change may wait before being written. Defaults to 1.0.
+            batch_size (int, optional): Number of changes written without waiting. Defaults to 100.
+        """
+        self.storage = storage
+        self.delay = delay
+        self.batch_size = batch_size
+        self.pending = 0  # Changes not written yet.
+        self.first_change = None  # Time of the oldest change not written yet.
+        self.condition = threading.Condition(storage.lock)
+        self.thread = None  # Started on the first change.
+        self.closed = False
+
+    def mark_dirty(self, count=1):
+        """
+        Records changes to be written by the background thread.
+
+        Args:
+            count (int, optional): Number of changes. Defaults to 1.
+        """
+        with self.condition:
+            if not self.pending:
+                self.first_change = time.monotonic()
+            self.pending += count
+            if self.thread is None:
+                self.closed = False
+                self.thread = threading.Thread(target=self.run, name='contacts-writer', daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+            if self.pending >= self.batch_size:
+                self.condition.notify()
+
+    def run(self):
+        """
+        Writes the pending changes once they are old or numerous enough, until closed.
+        """
+        with self.condition:
+            while not self.closed:
+                if not self.pending:
+                    self.condition.wait()
+                    continue
+                remaining = self.first_change + self.delay - time.monotonic()
+                if self.pending < self.batch_size and remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+                self.write()
+
+    def write(self):
+        """
+        Saves the storage. Must be called with the lock held.
+        """
+        self.pending = 0
+        try:
+            self.storage.save()
+        except OSError:
+            # Keep the thread alive; the next change tries again.
+            logging.exception("Background save of the contacts failed")
+
+    def flush(self):
+        """
+        Writes the pending changes now, waiting for a write in progress to finish.
+        """
+        with self.condition:
+            if self.pending:
+                self.write()
+
+    def close(self):
+        """
+        Writes the pending changes and stops the background thread.
+        """
+        with self.condition:
+            if self.pending:
+                self.write()
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            atexit.unregister(self.flush)